@@ -0,0 +1,151 @@
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from timecodec import format_time, parse_times
+
+try:
+    import ffmpeg
+except ImportError:
+    ffmpeg = None
+
+MANIFEST = 'clips.csv'
+# a cut point at most this far (ms) after a keyframe is cut by stream copy
+KEYFRAME_TOLERANCE = 1
+# container of the re-encoded clips (H.264 and AAC), whatever the one of the
+# video: Ogg, for one, can not hold them
+ENCODED_EXT = '.mp4'
+
+
+class Clip:
+
+    def __init__(self, path, label, begin, end, copy):
+        self.path = path
+        self.label = label
+        self.begin = begin
+        self.end = end
+        self.copy = copy
+
+
+def plan_clips(videoPath, marks, outputDir, frameIndex=None):
+    # one clip per closed mark (label, begin, end) as given by get_marks.
+    # A clip is named after its mark only, so that it keeps its name when
+    # other marks are added or deleted; identical names are numbered.
+    # Without frame index, every clip is re-encoded, to an mp4 file; a clip
+    # cut by stream copy keeps the container of the video. Only the begin
+    # has to be on a keyframe to cut by stream copy: the copy stops at the
+    # first packet past the end, and the frames up to it only reference the
+    # frames after the keyframe the clip starts at.
+    stem, ext = os.path.splitext(os.path.basename(videoPath))
+    begins = parse_times([m[1] for m in marks])
+    ends = parse_times([m[2] for m in marks])
+    clips = []
+    names = {}
+    for mark, begin, end in zip(marks, begins, ends):
+        if begin < 0 or end <= begin:
+            continue
+        label = re.sub(r'[^\w.-]+', '_', mark[0]) or 'mark'
+        name = "%s_%s_%d-%d" % (stem, label, begin, end)
+        names[name] = names.get(name, 0) + 1
+        if names[name] > 1:
+            name += "_%d" % names[name]
+        copy = frameIndex is not None and \
+            begin - frameIndex.keyframe(begin) <= KEYFRAME_TOLERANCE
+        clips.append(Clip(os.path.join(outputDir,
+                                       name + (ext if copy else ENCODED_EXT)),
+                          mark[0], int(begin), int(end), copy))
+    return clips
+
+
+def export_clip(job):
+    # runs in a worker process. The clip is written under a temporary name,
+    # renamed once complete: an interrupted export leaves no partial clip.
+    videoPath, path, begin, end, copy = job
+    stem, ext = os.path.splitext(path)
+    partPath = stem + '.part' + ext
+    options = {'t': (end - begin) / 1000}
+    if copy:
+        options.update(c='copy', avoid_negative_ts='make_zero')
+    else:
+        options.update(vcodec='libx264', preset='veryfast', acodec='aac')
+    try:
+        (ffmpeg
+         .input(videoPath, ss=begin / 1000)
+         .output(partPath, **options)
+         .global_args('-loglevel', 'error', '-nostdin')
+         .overwrite_output()
+         .run(capture_stdout=True, capture_stderr=True))
+        os.replace(partPath, path)
+    except ffmpeg.Error as e:
+        return path, e.stderr.decode('utf-8', 'replace').strip()
+    except OSError as e:
+        return path, str(e)
+    return path, None
+
+
+def write_manifest(outputDir, videoPath, clips):
+    with open(os.path.join(outputDir, MANIFEST), mode='w',
+              newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(['clip', 'video', 'label', 'begin', 'end', 'mode'])
+        for clip in clips:
+            if os.path.exists(clip.path):
+                writer.writerow([os.path.basename(clip.path), videoPath,
+                                 clip.label, format_time(clip.begin),
+                                 format_time(clip.end),
+                                 'copy' if clip.copy else 'encode'])
+
+
+def export_clips(videoPath, marks, outputDir, frameIndex=None, jobs=None,
+                 progress=None):
+    # exports the clips not exported yet, in parallel. progress(done, total)
+    # is called as clips are written. Returns the list of (path, error) of
+    # the failed clips.
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg-python is required to export clips")
+    os.makedirs(outputDir, exist_ok=True)
+    clips = plan_clips(videoPath, marks, outputDir, frameIndex)
+    todo = [(videoPath, c.path, c.begin, c.end, c.copy) for c in clips
+            if not os.path.exists(c.path)]
+    done = len(clips) - len(todo)
+    failed = []
+    if progress is not None:
+        progress(done, len(clips))
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            for future in as_completed([pool.submit(export_clip, job)
+                                        for job in todo]):
+                path, error = future.result()
+                if error is not None:
+                    failed.append((path, error))
+                done += 1
+                if progress is not None:
+                    progress(done, len(clips))
+    write_manifest(outputDir, videoPath, clips)
+    return failed
+
+
+class ClipExporter(QThread):
+    # export_clips off the GUI thread
+    progress = pyqtSignal(int, int)
+    exported = pyqtSignal(list)
+
+    def __init__(self, videoPath, marks, outputDir, frameIndex=None,
+                 parent=None):
+        super(ClipExporter, self).__init__(parent)
+        self.videoPath = videoPath
+        self.marks = marks
+        self.outputDir = outputDir
+        self.frameIndex = frameIndex
+
+    def run(self):
+        try:
+            failed = export_clips(self.videoPath, self.marks, self.outputDir,
+                                  self.frameIndex, progress=self.progress.emit)
+        except (OSError, RuntimeError) as e:
+            failed = [(self.outputDir, str(e))]
+        self.exported.emit(failed)
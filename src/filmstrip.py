@@ -0,0 +1,143 @@
+import math
+import os
+import struct
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+try:
+    import ffmpeg
+    FILMSTRIP_ERRORS = (OSError, ValueError, KeyError, ffmpeg.Error)
+except ImportError:
+    ffmpeg = None
+    FILMSTRIP_ERRORS = (OSError, ValueError, KeyError)
+
+# Layout of a thumbnail cache file: a header, one byte per thumbnail telling
+# if it was decoded already, then the RGB pixels of the thumbnails. The
+# header records the size and mtime of the video: a cache of a modified
+# video is started over.
+MAGIC = b'TOFUTHMB'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIIqq')
+HEADER_SIZE = 64
+
+WIDTH = 160
+HEIGHT = 90
+INTERVAL = 2000               # ms between two thumbnails
+MAX_BYTES = 32 * 1024 * 1024  # bound of the size of the pixels
+
+
+class Filmstrip:
+
+    def __init__(self, path, videoPath, duration):
+        st = os.stat(videoPath)
+        frameSize = WIDTH * HEIGHT * 3
+        maxCount = MAX_BYTES // frameSize
+        self.path = path
+        self.videoPath = videoPath
+        self.interval = max(INTERVAL, int(math.ceil(duration / maxCount)))
+        self.count = max(1, int(math.ceil(duration / self.interval)))
+        header = HEADER.pack(MAGIC, VERSION, WIDTH, HEIGHT, self.interval,
+                             self.count, st.st_size, st.st_mtime_ns)
+        size = HEADER_SIZE + self.count * (1 + frameSize)
+        if not self.__matches(header, size):
+            with open(path, 'wb') as f:
+                f.write(header.ljust(HEADER_SIZE, b'\0'))
+                f.truncate(size)
+        self.filled = np.memmap(path, np.uint8, 'r+', HEADER_SIZE,
+                                (self.count,))
+        self.pixels = np.memmap(path, np.uint8, 'r+',
+                                HEADER_SIZE + self.count,
+                                (self.count, HEIGHT, WIDTH, 3))
+
+    def __matches(self, header, size):
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read(HEADER.size) == header and \
+                    os.fstat(f.fileno()).st_size == size
+        except OSError:
+            return False
+
+    @staticmethod
+    def open(path, videoPath):
+        probe = ffmpeg.probe(videoPath)
+        duration = int(float(probe['format']['duration']) * 1000)
+        return Filmstrip(path, videoPath, duration)
+
+    def firstMissing(self):
+        missing = np.flatnonzero(self.filled == 0)
+        return int(missing[0]) if len(missing) else None
+
+    def store(self, i, frame):
+        self.pixels[i] = np.frombuffer(frame, np.uint8).reshape(
+            HEIGHT, WIDTH, 3)
+        self.filled[i] = 1
+
+    def flush(self):
+        self.filled.flush()
+        self.pixels.flush()
+
+    def thumbnail(self, t):
+        # the decoded thumbnail the nearest to t, or None
+        filled = np.flatnonzero(self.filled)
+        if len(filled) == 0:
+            return None
+        i = min(max(int(round(t / self.interval)), 0), self.count - 1)
+        j = np.searchsorted(filled, i)
+        candidates = filled[max(j - 1, 0):j + 1]
+        i = int(candidates[np.abs(candidates - i).argmin()])
+        return QImage(self.pixels[i].tobytes(), WIDTH, HEIGHT, WIDTH * 3,
+                      QImage.Format_RGB888).copy()
+
+
+class FilmstripWorker(QThread):
+    # Opens (or creates) the thumbnail cache of a video, then decodes the
+    # missing thumbnails in order, reporting each one as it is stored.
+    ready = pyqtSignal(str, object)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, videoPath, path, parent=None):
+        super(FilmstripWorker, self).__init__(parent)
+        self.videoPath = videoPath
+        self.path = path
+
+    def run(self):
+        if ffmpeg is None:
+            return
+        try:
+            strip = Filmstrip.open(self.path, self.videoPath)
+        except FILMSTRIP_ERRORS as e:
+            self.failed.emit("could not open the thumbnails of %s: %s"
+                             % (self.videoPath, e))
+            return
+        self.ready.emit(self.videoPath, strip)
+        start = strip.firstMissing()
+        if start is None:
+            return
+
+        process = (ffmpeg
+                   .input(self.videoPath, ss=start * strip.interval / 1000)
+                   .filter('fps', fps='1000/%d' % strip.interval)
+                   .filter('scale', WIDTH, HEIGHT,
+                           force_original_aspect_ratio='decrease')
+                   .filter('pad', WIDTH, HEIGHT, '(ow-iw)/2', '(oh-ih)/2')
+                   .output('pipe:', format='rawvideo', pix_fmt='rgb24')
+                   .global_args('-loglevel', 'error', '-nostdin')
+                   .run_async(pipe_stdout=True))
+        frameSize = WIDTH * HEIGHT * 3
+        i = start
+        try:
+            while i < strip.count and not self.isInterruptionRequested():
+                frame = process.stdout.read(frameSize)
+                if len(frame) < frameSize:
+                    break
+                strip.store(i, frame)
+                self.progress.emit(i)
+                i += 1
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+            strip.flush()
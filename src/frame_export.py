@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from timecodec import parse_times
+
+try:
+    import ffmpeg
+except ImportError:
+    ffmpeg = None
+
+# one row per exported frame: where it is stored, its label, and its time in
+# the source video (ms)
+INDEX = np.dtype([('shard', '<u4'), ('offset', '<u4'), ('label', '<u4'),
+                  ('time', '<i8')])
+INDEX_FILE = 'index.npy'
+LABELS_FILE = 'labels.txt'
+SHARD_FILE = 'frames_%05d.npy'
+
+
+class Slice:
+    # a closed mark of a video, and the range of the frames reserved for it
+    # in the shards
+
+    def __init__(self, videoPath, labelId, begin, end, first, count):
+        self.videoPath = videoPath
+        self.labelId = labelId
+        self.begin = begin
+        self.end = end
+        self.first = first
+        self.count = count
+
+
+def plan_slices(videos, fps):
+    # videos: list of (videoPath, marks as (label, begin, end) rows). Every
+    # slice gets (end - begin) * fps frames, numbered across all videos.
+    labelIdx = {}
+    slices = []
+    total = 0
+    for videoPath, marks in videos:
+        begins = parse_times([m[1] for m in marks])
+        ends = parse_times([m[2] for m in marks])
+        for mark, begin, end in zip(marks, begins, ends):
+            if begin < 0 or end <= begin:
+                continue
+            labelId = labelIdx.setdefault(mark[0], len(labelIdx))
+            count = max(1, int((end - begin) * fps // 1000))
+            slices.append(Slice(videoPath, labelId, int(begin), int(end),
+                                total, count))
+            total += count
+    return slices, list(labelIdx), total
+
+
+def create_shards(outputDir, total, shardFrames, width, height):
+    paths = []
+    for first in range(0, total, shardFrames):
+        path = os.path.join(outputDir, SHARD_FILE % len(paths))
+        shard = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.uint8,
+            shape=(min(shardFrames, total - first), height, width, 3))
+        del shard
+        paths.append(path)
+    return paths
+
+
+def export_slice(job):
+    # runs in a worker process: decodes the frames of a slice one at a time
+    # into the shards, so that memory stays bounded by a frame. Returns the
+    # number of frames decoded, and an error or None.
+    videoPath, begin, end, first, count, fps, width, height, shardPaths, \
+        shardFrames = job
+    frameSize = width * height * 3
+    shards = {}
+    decoded = 0
+    try:
+        process = (ffmpeg
+                   .input(videoPath, ss=begin / 1000, t=(end - begin) / 1000)
+                   .filter('fps', fps=fps)
+                   .filter('scale', width, height,
+                           force_original_aspect_ratio='decrease')
+                   .filter('pad', width, height, '(ow-iw)/2', '(oh-ih)/2')
+                   .output('pipe:', format='rawvideo', pix_fmt='rgb24')
+                   .global_args('-loglevel', 'error', '-nostdin')
+                   .run_async(pipe_stdout=True))
+    except OSError as e:
+        return 0, str(e)
+    try:
+        while decoded < count:
+            frame = process.stdout.read(frameSize)
+            if len(frame) < frameSize:
+                break
+            shard, offset = divmod(first + decoded, shardFrames)
+            if shard not in shards:
+                shards[shard] = np.load(shardPaths[shard], mmap_mode='r+')
+            shards[shard][offset] = np.frombuffer(frame, np.uint8).reshape(
+                height, width, 3)
+            decoded += 1
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        for shard in shards.values():
+            shard.flush()
+    return decoded, None
+
+
+def export_frames(videos, outputDir, fps=5, width=224, height=224,
+                  shardFrames=4096, jobs=None, progress=None):
+    # decodes the closed marks of the videos to frames of height x width
+    # RGB pixels, in .npy shards of shardFrames frames. The index lists the
+    # frames actually decoded: a slice running past the end of its video
+    # leaves zero frames behind. Returns the index and the list of
+    # (videoPath, begin, error) of the failed slices.
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg-python is required to export frames")
+    os.makedirs(outputDir, exist_ok=True)
+    slices, labels, total = plan_slices(videos, fps)
+    shardPaths = create_shards(outputDir, total, shardFrames, width, height)
+    with open(os.path.join(outputDir, LABELS_FILE), mode='w',
+              encoding='utf-8') as labels_file:
+        labels_file.writelines(label + '\n' for label in labels)
+
+    decoded = [0] * len(slices)
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = {pool.submit(export_slice,
+                               (s.videoPath, s.begin, s.end, s.first, s.count,
+                                fps, width, height, shardPaths,
+                                shardFrames)): i
+                   for i, s in enumerate(slices)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            decoded[i], error = future.result()
+            if error is not None:
+                failed.append((slices[i].videoPath, slices[i].begin, error))
+            if progress is not None:
+                progress(done, len(slices))
+
+    index = np.empty(sum(decoded), dtype=INDEX)
+    row = 0
+    for s, n in zip(slices, decoded):
+        frames = s.first + np.arange(n)
+        index['shard'][row:row + n] = frames // shardFrames
+        index['offset'][row:row + n] = frames % shardFrames
+        index['label'][row:row + n] = s.labelId
+        index['time'][row:row + n] = s.begin + np.arange(n) * 1000 // fps
+        row += n
+    np.save(os.path.join(outputDir, INDEX_FILE), index)
+    return index, failed
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import subprocess
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    import ffmpeg
+    INDEX_ERRORS = (OSError, ValueError, KeyError, ffmpeg.Error)
+except ImportError:
+    ffmpeg = None
+    INDEX_ERRORS = (OSError, ValueError, KeyError)
+
+
+class FrameIndex:
+    # Sorted presentation times (ms) of the frames of a video, and the
+    # subset of them that are keyframes. Every lookup is a binary search.
+
+    def __init__(self, times, keyframes):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.times)
+
+    def frame(self, t):
+        # index of the frame shown at t
+        return max(int(np.searchsorted(self.times, t, 'right')) - 1, 0)
+
+    def snap(self, t):
+        # beginning of the frame shown at t
+        if len(self.times) == 0:
+            return t
+        return int(self.times[self.frame(t)])
+
+    def step(self, t, frames):
+        # beginning of the frame shown `frames` frames after (or before, if
+        # negative) the one shown at t
+        if len(self.times) == 0:
+            return t
+        i = min(max(self.frame(t) + frames, 0), len(self.times) - 1)
+        return int(self.times[i])
+
+    def keyframe(self, t):
+        # the last keyframe at or before t
+        if len(self.keyframes) == 0:
+            return 0
+        i = max(int(np.searchsorted(self.keyframes, t, 'right')) - 1, 0)
+        return int(self.keyframes[i])
+
+    def save(self, path):
+        # times are delta-encoded, which compresses to a few bits per frame
+        np.savez_compressed(path, deltas=np.diff(self.times, prepend=0),
+                            keyframes=np.isin(self.times, self.keyframes))
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            times = np.cumsum(data['deltas'])
+            return FrameIndex(times, times[data['keyframes']])
+
+    @staticmethod
+    def extract(videoPath, started=None):
+        # reads the packets of the first video stream, without decoding them.
+        # started(process) is called with the ffprobe process, which may be
+        # killed to stop the extraction.
+        process = subprocess.Popen(
+            ['ffprobe', '-select_streams', 'v:0', '-show_packets',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'json',
+             videoPath], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if started is not None:
+            started(process)
+        out, err = process.communicate()
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffprobe', out, err)
+        probe = json.loads(out.decode('utf-8'))
+        times = []
+        keyframes = []
+        for packet in probe.get('packets', []):
+            pts = packet.get('pts_time', 'N/A')
+            if pts == 'N/A':
+                continue
+            ms = int(round(float(pts) * 1000))
+            times.append(ms)
+            if 'K' in packet.get('flags', ''):
+                keyframes.append(ms)
+        return FrameIndex(np.unique(times), np.unique(keyframes))
+
+
+def cache_key(videoPath):
+    # identity of a video file: its path, size and modification time
+    st = os.stat(videoPath)
+    identity = "%s|%d|%d" % (os.path.abspath(videoPath), st.st_size,
+                             st.st_mtime_ns)
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def index_video(videoPath, cacheDir=None, started=None):
+    # the frame index of a video, from the cache directory if it was built
+    # already. Returns None if it can not be built. started is passed to
+    # FrameIndex.extract.
+    cachePath = None
+    if cacheDir is not None:
+        cachePath = os.path.join(cacheDir, cache_key(videoPath) + '.npz')
+        if os.path.exists(cachePath):
+            return FrameIndex.load(cachePath)
+    if ffmpeg is None:
+        return None
+    index = FrameIndex.extract(videoPath, started)
+    if cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        index.save(cachePath)
+    return index
+
+
+class FrameIndexer(QThread):
+    # Builds the frame index of a video off the GUI thread, or loads it from
+    # the cache directory if it was already built. stop() kills ffprobe, so
+    # that the thread can be joined at once.
+    indexed = pyqtSignal(str, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, videoPath, cacheDir, parent=None):
+        super(FrameIndexer, self).__init__(parent)
+        self.videoPath = videoPath
+        self.cacheDir = cacheDir
+        self.process = None
+
+    def run(self):
+        index = None
+        try:
+            index = index_video(self.videoPath, self.cacheDir, self.__started)
+        except INDEX_ERRORS as e:
+            if not self.isInterruptionRequested():
+                self.failed.emit("could not index the frames of %s: %s"
+                                 % (self.videoPath, e))
+        if self.isInterruptionRequested():
+            return
+        if index is not None and len(index) > 0:
+            self.indexed.emit(self.videoPath, index)
+
+    def __started(self, process):
+        self.process = process
+        if self.isInterruptionRequested():
+            process.kill()
+
+    def stop(self):
+        self.requestInterruption()
+        if self.process is not None:
+            self.process.kill()
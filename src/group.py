@@ -1,6 +1,29 @@
+import re
 
+import numpy as np
 from PyQt5.QtCore import pyqtSignal, QObject
 
+# separators of the names in a list of incompatible predecessors
+SEPARATORS = re.compile(r'[,;]')
+
+
+def parse_labels(text, known=()):
+    # the label names of a list, separated by commas or semicolons. A list
+    # without any is split on spaces ("sit walk"), unless it is one of the
+    # known names.
+    if not isinstance(text, str):
+        return list(text or [])
+    if SEPARATORS.search(text) is None:
+        name = " ".join(text.split())
+        return [name] if name in known else text.split()
+    names = []
+    for name in SEPARATORS.split(text):
+        name = " ".join(name.split())
+        if name:
+            names.append(name)
+    return names
+
+
 class Label:
     def __init__(self, name, group, pred_incomp):
         self.name = name
@@ -9,6 +32,11 @@ class Label:
 
 
 class LabelGroups(QObject):
+    # The definitions of the labels. The lists of incompatible predecessors
+    # are parsed once per change of the definitions, into a boolean matrix
+    # indexed by label id, and the groups into an array of the group index
+    # of each label id: a check of a pair of labels, or of the group of a
+    # label, is an array lookup.
     
     changed = pyqtSignal()
     
@@ -16,35 +44,97 @@ class LabelGroups(QObject):
         super().__init__()
         
         self.labels = {}
+        # integer ids of the label names, shared by the marks and the
+        # shortcuts; an id stays valid once given, even if its label is
+        # removed
+        self.labelNames = []
+        self.labelIdx = {}
+        self.stale = True
     
     def clear(self):
         self.labels = {}
+        self.stale = True
         self.changed.emit()
 
+    def internLabel(self, labelName):
+        if labelName not in self.labelIdx:
+            self.labelIdx[labelName] = len(self.labelNames)
+            self.labelNames.append(labelName)
+        return self.labelIdx[labelName]
+
+    def __update(self):
+        # parses the definitions changed since the last call
+        if not self.stale:
+            return
+        preds = {self.internLabel(name):
+                 [self.internLabel(p) for p in
+                  parse_labels(label.pred_incompatibilies, self.labels)]
+                 for name, label in self.labels.items()}
+        n = len(self.labelNames)
+        self.incompatible = np.zeros((n, n), dtype=bool)
+        for lid, pids in preds.items():
+            self.incompatible[lid, pids] = True
+        self.groupNames = sorted({label.group for label
+                                  in self.labels.values() if label.group})
+        groupIdx = {group: i for i, group in enumerate(self.groupNames)}
+        # label id -> index of its group in groupNames, -1 if none
+        self.labelGroups = np.full(n, -1, dtype=np.int64)
+        for name, label in self.labels.items():
+            if label.group:
+                self.labelGroups[self.labelIdx[name]] = groupIdx[label.group]
+        self.stale = False
+
     def getGroupName(self, labelName):
         if labelName in self.labels:
             return self.labels[labelName].group
         else:
             return ""
+
+    def getGroupNames(self):
+        self.__update()
+        return self.groupNames
+
+    def getGroupId(self, lid):
+        # index in getGroupNames() of the group of the label id, -1 if none
+        self.__update()
+        if 0 <= lid < len(self.labelGroups):
+            return int(self.labelGroups[lid])
+        return -1
     
     def getPredIncomp(self, labelName):
         if labelName in self.labels:
-            return self.labels[labelName].pred_incompatibilies
+            return parse_labels(self.labels[labelName].pred_incompatibilies,
+                                self.labels)
         else:
             return []
         
     def isIncompPred(self, label1, label2):
-        return label2 in self.getPredIncomp(label1)
+        return self.isIncompPredId(self.labelIdx.get(label1, -1),
+                                   self.labelIdx.get(label2, -1))
+
+    def isIncompPredId(self, lid1, lid2):
+        # the labels named after the last change have no incompatibility
+        self.__update()
+        n = len(self.incompatible)
+        return 0 <= lid1 < n and 0 <= lid2 < n and \
+            bool(self.incompatible[lid1, lid2])
     
     def addLabels(self, labels):
+        # a single change for all of them
         for l in labels:
-            self.addLabel(l[0], l[1], l[2])
+            self.__add(l[0], l[1], l[2])
         self.changed.emit()
         
     def addLabel(self, labelName, group, pred_incomp):
-        self.labels[labelName] = Label(labelName, group, pred_incomp)
+        self.__add(labelName, group, pred_incomp)
         self.changed.emit()
 
+    def __add(self, labelName, group, pred_incomp):
+        self.internLabel(labelName)
+        self.labels[labelName] = Label(labelName, group, pred_incomp)
+        self.stale = True
+
     def removeLabel(self, labelName):
         self.labels.pop(labelName)
+        self.stale = True
         self.changed.emit()
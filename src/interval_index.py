@@ -0,0 +1,71 @@
+from bisect import bisect_left, bisect_right, insort
+
+# end value used for marks that are still open ('...')
+OPEN_END = float('inf')
+
+
+class IntervalIndex:
+    # Stabbing index over the marks of a table whose rows are kept sorted by
+    # begin. The longest finite interval bounds how far back a query has to
+    # look, so "which rows cover t" only visits the rows starting in
+    # [t - maxLen, t], found by binary search on the begins column itself.
+    # Only the lengths of the closed intervals are kept (sorted, for
+    # maxLen), and the rows of the open ones apart.
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.lengths = []
+        self.opened = set()
+
+    def __add(self, row, begin, end):
+        if end == OPEN_END:
+            self.opened.add(row)
+        else:
+            insort(self.lengths, end - begin)
+
+    def __discard(self, row, begin, end):
+        if end == OPEN_END:
+            self.opened.discard(row)
+        else:
+            del self.lengths[bisect_left(self.lengths, end - begin)]
+
+    def rebuild(self, lengths, opened):
+        self.lengths = sorted(lengths)
+        self.opened = set(opened)
+
+    def insert(self, row, begin, end):
+        # a row was inserted: the following ones are renumbered
+        self.opened = {r if r < row else r + 1 for r in self.opened}
+        self.__add(row, begin, end)
+
+    def remove(self, row, begin, end):
+        self.__discard(row, begin, end)
+        self.opened = {r if r < row else r - 1 for r in self.opened}
+
+    def update(self, row, old, new):
+        # old and new are the (begin, end) of the row
+        self.__discard(row, *old)
+        self.__add(row, *new)
+
+    def move(self, row, newRow):
+        if row in self.opened:
+            self.remove(row, 0, OPEN_END)
+            self.insert(newRow, 0, OPEN_END)
+        else:
+            self.opened = {r if r < row else r - 1 for r in self.opened}
+            self.opened = {r if r < newRow else r + 1 for r in self.opened}
+
+    def covering(self, t, begins, ends):
+        # begins and ends are the columns of the table, sorted by begin.
+        # The end of the open rows is never compared.
+        maxLen = self.lengths[-1] if self.lengths else 0
+        lo = bisect_left(begins, t - maxLen)
+        hi = bisect_right(begins, t)
+        result = {row for row in range(lo, hi)
+                  if t <= ends[row] and row not in self.opened}
+        for row in self.opened:
+            if begins[row] <= t:
+                result.add(row)
+        return result
@@ -0,0 +1,147 @@
+import csv
+import hashlib
+import os
+
+from timecodec import marks_from_rows
+
+# Operations of the journal, one csv row each:
+#   base, digest              start from the csv file of the video, sorted
+#                             by begin. The edits which follow are skipped
+#                             if the digest is not the one of the csv file:
+#                             it was rewritten with them by a compaction cut
+#                             before the journal was started over.
+#   reset                     start from no marks
+#   append, label, begin, end (in ms, end -1 if the mark is not closed)
+#   insert, row, label, begin, end
+#   delete, row
+#   label, row, label
+#   begin, row, ms
+#   end, row, ms
+#   move, row, new row        a mark whose begin changed, back in order
+#   sort                      stable sort by begin, left by older versions
+
+
+class Journal:
+    # Write-ahead log of the edits of the marks of a video, next to its csv
+    # file. Each edit is one small append; compact() writes the marks to the
+    # csv file and starts the journal over.
+
+    def __init__(self, path, csvPath):
+        self.path = path
+        self.csvPath = csvPath
+        self.count = 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+    def record(self, *operation):
+        self.writer.writerow(operation)
+        self.file.flush()
+        self.count += 1
+
+    def recordBase(self):
+        self.record('base', csv_digest(self.csvPath))
+
+    def recordMarks(self, labels, begins, ends):
+        self.writer.writerow(('reset',))
+        self.writer.writerows(('append', l, b, e)
+                              for l, b, e in zip(labels, begins, ends))
+        self.file.flush()
+        self.count += 1
+
+    def compact(self, rows):
+        tmpPath = self.csvPath + '.tmp'
+        with open(tmpPath, mode='w', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',', quotechar='"',
+                                quoting=csv.QUOTE_MINIMAL)
+            writer.writerows(rows)
+        digest = csv_digest(tmpPath)
+        os.replace(tmpPath, self.csvPath)
+        self.file.seek(0)
+        self.file.truncate()
+        self.record('base', digest)
+        self.count = 0
+
+    def close(self):
+        self.file.close()
+
+
+def read_csv(path):
+    if not os.path.exists(path):
+        return [], [], []
+    with open(path, mode='r') as csv_file:
+        rows = csv.reader(csv_file, delimiter=',', quotechar='"',
+                          quoting=csv.QUOTE_MINIMAL)
+        labels, begins, ends = marks_from_rows(rows)
+    return labels, begins.tolist(), ends.tolist()
+
+
+def csv_digest(path):
+    if not os.path.exists(path):
+        return ''
+    with open(path, mode='rb') as csv_file:
+        return hashlib.sha1(csv_file.read()).hexdigest()
+
+
+def sort_marks(labels, begins, ends):
+    # stable sort by begin, the order of the rows of the table
+    order = sorted(range(len(begins)), key=begins.__getitem__)
+    return ([labels[r] for r in order], [begins[r] for r in order],
+            [ends[r] for r in order])
+
+
+# operations which only set the marks the edits start from
+STARTS = ('base', 'reset', 'sort')
+
+
+def replay(path, csvPath):
+    # the marks (labels, begins, ends) left by the journal, and the number
+    # of edits replayed, 0 for a journal closed cleanly. The edits are
+    # applied to plain lists, the model is then loaded once.
+    labels, begins, ends = [], [], []
+    count = 0
+    digest = csv_digest(csvPath)
+    stale = False
+    with open(path, mode='r', newline='') as journal_file:
+        for op in csv.reader(journal_file):
+            try:
+                if op[0] == 'base':
+                    labels, begins, ends = sort_marks(*read_csv(csvPath))
+                    # older journals have no digest
+                    stale = len(op) > 1 and op[1] != digest
+                elif op[0] == 'reset':
+                    labels, begins, ends = [], [], []
+                    stale = False
+                elif stale:
+                    continue
+                elif op[0] == 'append':
+                    labels.append(op[1])
+                    begins.append(int(op[2]))
+                    ends.append(int(op[3]))
+                elif op[0] == 'insert':
+                    row = int(op[1])
+                    labels.insert(row, op[2])
+                    begins.insert(row, int(op[3]))
+                    ends.insert(row, int(op[4]))
+                elif op[0] == 'delete':
+                    row = int(op[1])
+                    del labels[row], begins[row], ends[row]
+                elif op[0] == 'label':
+                    labels[int(op[1])] = op[2]
+                elif op[0] == 'begin':
+                    begins[int(op[1])] = int(op[2])
+                elif op[0] == 'end':
+                    ends[int(op[1])] = int(op[2])
+                elif op[0] == 'move':
+                    row, newRow = int(op[1]), int(op[2])
+                    for column in (labels, begins, ends):
+                        column.insert(newRow, column.pop(row))
+                elif op[0] == 'sort':
+                    labels, begins, ends = sort_marks(labels, begins, ends)
+                else:
+                    continue
+            except (IndexError, ValueError):
+                # a line cut by a crash
+                break
+            if op[0] not in STARTS:
+                count += 1
+    return (labels, begins, ends), count
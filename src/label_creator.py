@@ -42,10 +42,9 @@ class LabelCreatorWidget(QWidget):
             self.deleteRowInternal(row)
 
     def deleteRowInternal(self, row):
-        keySeqStr = self.tableWidget.item(row, 2).text()
         label = self.tableWidget.item(row, 1).text()
         self.groups.removeLabel(label)
-        self.comm.delLabelSignal.emit(keySeqStr)
+        self.comm.delLabelSignal.emit(self.groups.internLabel(label))
         self.tableWidget.removeRow(row)
 
     def createImportExportButtons(self):
@@ -170,7 +169,7 @@ class LabelCreatorWidget(QWidget):
         delButton.clicked.connect(self.deleteRow)
         self.tableWidget.setCellWidget(index, 3, delButton)
         self.tableWidget.scrollToItem(keyItem)
-        self.comm.newLabelSignal.emit(keySeq, label)
+        self.comm.newLabelSignal.emit(keySeq, self.groups.internLabel(label))
         self.tableWidget.insertRow(index+1)
         newButton = self._create_newButton()
         self.tableWidget.setCellWidget(index+1, 3, newButton)
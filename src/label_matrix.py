@@ -0,0 +1,133 @@
+import numpy as np
+
+# Frame level targets: which labels are marked on each frame of a video.
+# A frame is shown from its time until the time of the next frame, and
+# carries the labels of the marks overlapping that range. A mark without
+# duration labels the frame shown at its begin; marks without end are
+# ignored.
+
+
+def frame_times(duration, fps):
+    # times (ms) of the frames of a video sampled at fps
+    return np.arange(0, duration, 1000 / fps).astype(np.int64)
+
+
+def label_runs(labelIds, begins, ends, times):
+    # (label, first frame, last frame + 1) of the marks, merged when they
+    # overlap, sorted by label then frame
+    labelIds = np.asarray(labelIds, dtype=np.int64)
+    begins = np.asarray(begins, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    closed = ends >= begins
+    labelIds, begins, ends = labelIds[closed], begins[closed], ends[closed]
+
+    starts = np.maximum(np.searchsorted(times, begins, 'right') - 1, 0)
+    stops = np.maximum(np.searchsorted(times, ends, 'left'), starts + 1)
+    stops = np.minimum(stops, len(times))
+    keep = starts < stops
+    labelIds, starts, stops = labelIds[keep], starts[keep], stops[keep]
+    if len(starts) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+
+    order = np.lexsort((starts, labelIds))
+    labelIds, starts, stops = labelIds[order], starts[order], stops[order]
+    # running end of the runs within each label: the labels are made
+    # increasing by an offset larger than any frame number
+    offset = labelIds * (len(times) + 1)
+    reach = np.maximum.accumulate(stops + offset) - offset
+    newRun = np.ones(len(starts), dtype=bool)
+    newRun[1:] = (labelIds[1:] != labelIds[:-1]) | (starts[1:] > reach[:-1])
+    first = np.flatnonzero(newRun)
+    last = np.append(first[1:], len(starts)) - 1
+    return np.stack([labelIds[first], starts[first], reach[last]], axis=1)
+
+
+def dense_matrix(runs, frames, labels):
+    # frames x labels matrix of 0/1 from the runs of label_runs
+    delta = np.zeros((frames + 1, labels), dtype=np.int32)
+    np.add.at(delta, (runs[:, 1], runs[:, 0]), 1)
+    np.add.at(delta, (runs[:, 2], runs[:, 0]), -1)
+    return (np.cumsum(delta[:-1], axis=0) > 0).astype(np.uint8)
+
+
+def class_column(matrix):
+    # a single column for labels which exclude each other: 0 on the frames
+    # without any of them, else 1 + the column of the label. Overlapping
+    # marks (invalid in the label editor) resolve to the first column.
+    return np.where(matrix.any(axis=1), matrix.argmax(axis=1) + 1, 0) \
+        .astype(np.int16)
+
+
+def select_runs(runs, columns, labels):
+    # the runs of the labels in columns, renumbered by their position there
+    position = np.full(labels, -1, dtype=np.int64)
+    position[columns] = np.arange(len(columns))
+    selected = runs[np.isin(runs[:, 0], columns)].copy()
+    selected[:, 0] = position[selected[:, 0]]
+    return selected
+
+
+def value_runs(column):
+    # (first frame, last frame + 1, value) of the runs of non-zero values
+    change = np.flatnonzero(np.diff(column, prepend=0, append=0))
+    starts, stops = change[:-1], change[1:]
+    values = column[starts]
+    keep = values != 0
+    return np.stack([starts[keep], stops[keep], values[keep]], axis=1) \
+        .astype(np.int64)
+
+
+def export_matrix(path, labels, begins, ends, times, groups=None,
+                  encoding='dense'):
+    # writes the frame level targets of the marks (labels, begins, ends in
+    # ms) at the given frame times to a .npz file. groups maps labels to the
+    # name of their exclusive group: the labels of a group give a single
+    # class column instead of one column each. With encoding 'runs', the
+    # columns are stored as runs of frames instead of dense arrays.
+    groups = groups or {}
+    names = sorted(set(labels))
+    labelIdx = {name: i for i, name in enumerate(names)}
+    labelIds = np.array([labelIdx[l] for l in labels], dtype=np.int64)
+    runs = label_runs(labelIds, begins, ends, times)
+
+    members = {}
+    for i, name in enumerate(names):
+        if groups.get(name, "") != "":
+            members.setdefault(groups[name], []).append(i)
+    groupNames = sorted(members)
+    grouped = set(i for g in groupNames for i in members[g])
+    columns = [i for i in range(len(names)) if i not in grouped]
+
+    result = {
+        'times': times,
+        'labels': np.array([names[i] for i in columns], dtype=str),
+        'groups': np.array(groupNames, dtype=str),
+        # class k of group g is class_label[class_group == g][k - 1]
+        'class_group': np.array([g for g, name in enumerate(groupNames)
+                                 for i in members[name]], dtype=np.int64),
+        'class_label': np.array([names[i] for g in groupNames
+                                 for i in members[g]], dtype=str),
+    }
+
+    # only the labels of one group at a time are made dense
+    classes = []
+    for g in groupNames:
+        matrix = dense_matrix(select_runs(runs, members[g], len(names)),
+                              len(times), len(members[g]))
+        classes.append(class_column(matrix))
+    own = select_runs(runs, columns, len(names))
+
+    if encoding == 'runs':
+        result['runs'] = own
+        result['class_runs'] = np.concatenate(
+            [np.empty((0, 4), dtype=np.int64)] +
+            [np.column_stack([np.full(len(r), g, dtype=np.int64), r])
+             for g, r in enumerate(map(value_runs, classes))])
+    else:
+        result['matrix'] = dense_matrix(own, len(times), len(columns))
+        if classes:
+            result['classes'] = np.stack(classes, axis=1)
+        else:
+            result['classes'] = np.zeros((len(times), 0), dtype=np.int16)
+    np.savez_compressed(path, **result)
+    return result
@@ -1,101 +1,230 @@
-import sys
-from PyQt5.QtWidgets import (QWidget, QSlider, QApplication,
-                             QHBoxLayout, QVBoxLayout)
-from PyQt5.QtCore import QObject, Qt, pyqtSignal
-from PyQt5.QtGui import QPainter, QFont, QColor, QPen
-
-from signals import SignalBus
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QRect, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QPen, QImage, QPixmap
+
+from marks_model import NO_END
+from tracer import span
+
+LANE_HEIGHT = 8
+MIN_HEIGHT = 30
+MAX_HEIGHT = 90
+MIN_SPAN = 200
+
+
+class Lane:
+    # marks of one label, sorted by begin, with their ends sorted apart and
+    # the cumulative sums of both: the length covered before any time, at
+    # any zoom level, is two binary searches away, and the memory of a lane
+    # grows with its marks only.
+
+    def __init__(self, labelId, begins, ends):
+        order = np.argsort(begins, kind='stable')
+        self.labelId = labelId
+        self.begins = begins[order]
+        self.ends = ends[order]
+        self.maxLength = int((self.ends - self.begins).max())
+        self.sortedEnds = np.sort(self.ends)
+        self.sumBegins = np.concatenate(([0], np.cumsum(self.begins)))
+        self.sumEnds = np.concatenate(([0], np.cumsum(self.sortedEnds)))
+
+    def covered(self, edges):
+        # total length covered by the marks before each edge, overlaps
+        # counted as many times as they overlap
+        nb = np.searchsorted(self.begins, edges)
+        ne = np.searchsorted(self.sortedEnds, edges)
+        return nb * edges - self.sumBegins[nb] - \
+            (ne * edges - self.sumEnds[ne])
+
+    def visible(self, first, last):
+        # range of the marks which may intersect [first, last]
+        return (int(np.searchsorted(self.begins, first - self.maxLength)),
+                int(np.searchsorted(self.begins, last, 'right')))
+
+    def density(self, edges):
+        covered = self.covered(edges)
+        return np.clip(np.diff(covered) / np.diff(edges), 0, 1)
 
 
 class LabelSliderWidget(QWidget):
+    # Timeline of the marks under the position slider, one lane per label.
+    # The lanes are rendered to a cached pixmap, rebuilt only when the marks,
+    # the zoom or the size change; a position tick only repaints the
+    # columns of the old and new playhead.
+    clicked = pyqtSignal(int)
 
     def __init__(self):
         super(LabelSliderWidget, self).__init__()
+        self.model = None
+        self.value = 0
+        self.duration = 0
+        self.viewBegin = 0
+        self.viewSpan = None
+        self.lanes = None
+        self.lanesEnd = 0
+        self.layer = None
         self.initUI()
 
     def initUI(self):
-        self.setMinimumSize(170, 30)
-        self.setMaximumHeight(30)
-        self.value = 2
-        self.num = [2, 4, 6, 8]
+        self.setMinimumSize(170, MIN_HEIGHT)
+        self.setMaximumHeight(MIN_HEIGHT)
+        self.setToolTip("Wheel to zoom, shift+wheel to scroll, "
+                        "double click to show the whole video")
+
+    def setModel(self, model):
+        self.model = model
+        model.marksChanged.connect(self.invalidateMarks)
+        self.invalidateMarks()
+
+    def invalidateMarks(self):
+        self.lanes = None
+        self.invalidateLayer()
+
+    def invalidateLayer(self):
+        self.layer = None
+        self.update()
+
+    def setDuration(self, duration):
+        self.duration = duration
+        self.viewBegin = 0
+        self.viewSpan = None
+        self.invalidateMarks()
 
     def setValue(self, value):
+        old = self.xOf(self.value)
         self.value = value
-
-    def paintEvent(self, e):
-        qp = QPainter()
-        qp.begin(self)
-        self.drawWidget(qp)
+        if self.viewSpan is not None and not \
+                self.viewBegin <= value < self.viewBegin + self.viewSpan:
+            # follow the playhead when zoomed in
+            self.viewBegin = max(0, min(value, self.extent() - self.viewSpan))
+            self.invalidateLayer()
+            return
+        new = self.xOf(value)
+        if new != old:
+            h = self.height()
+            self.update(QRect(old - 1, 0, 3, h))
+            self.update(QRect(new - 1, 0, 3, h))
+
+    def extent(self):
+        if self.lanes:
+            return max(self.duration, self.lanesEnd, 1)
+        return max(self.duration, 1)
+
+    def view(self):
+        span = self.viewSpan if self.viewSpan is not None else self.extent()
+        return self.viewBegin, span
+
+    def xOf(self, t):
+        begin, span = self.view()
+        return int((t - begin) * self.width() / span)
+
+    def timeAt(self, x):
+        begin, span = self.view()
+        return int(begin + x * span / max(self.width(), 1))
+
+    def buildLanes(self):
+        m = self.model
+        self.lanes = []
+        self.lanesEnd = 0
+        if m is None or len(m.begins) == 0:
+            self.updateHeight(0)
+            return
+        begins = np.asarray(m.begins)
+        ends = np.asarray(m.ends)
+        # marks still open are drawn as a tick at their begin
+        ends = np.where(ends == NO_END, begins, np.maximum(ends, begins))
+        labelIds = np.asarray(m.labelIds)
+        self.lanesEnd = int(ends.max())
+        for labelId in np.unique(labelIds):
+            mask = labelIds == labelId
+            self.lanes.append(Lane(int(labelId), begins[mask], ends[mask]))
+        self.updateHeight(len(self.lanes))
+
+    def updateHeight(self, lanes):
+        height = min(max(lanes * LANE_HEIGHT + 2, MIN_HEIGHT), MAX_HEIGHT)
+        self.setMinimumHeight(height)
+        self.setMaximumHeight(height)
+
+    def laneColor(self, labelId):
+        return QColor.fromHsv((labelId * 67) % 360, 170, 210)
+
+    def renderLayer(self):
+        w = max(self.width(), 1)
+        h = max(self.height(), 1)
+        begin, span = self.view()
+        laneHeight = (h - 2) / max(len(self.lanes), 1)
+        edges = begin + np.arange(w + 1) * (span / w)
+
+        # density bands of the crowded lanes, blended onto a white image
+        pixels = np.full((h, w, 3), 255, dtype=np.uint8)
+        exact = []
+        for i, lane in enumerate(self.lanes):
+            first, last = lane.visible(begin, begin + span)
+            if last - first <= w:
+                exact.append((i, lane, first, last))
+                continue
+            color = self.laneColor(lane.labelId)
+            rgb = np.array([color.red(), color.green(), color.blue()])
+            alpha = lane.density(edges)[:, None]
+            row = (255 * (1 - alpha) + rgb * alpha).astype(np.uint8)
+            pixels[1 + int(i * laneHeight):1 + int((i + 1) * laneHeight)] = row
+        image = QImage(pixels.tobytes(), w, h, w * 3, QImage.Format_RGB888)
+        self.layer = QPixmap.fromImage(image)
+
+        qp = QPainter(self.layer)
+        # the few marks of the other lanes are drawn exactly
+        qp.setPen(Qt.NoPen)
+        scale = w / span
+        for i, lane, first, last in exact:
+            qp.setBrush(self.laneColor(lane.labelId))
+            y = 1 + int(i * laneHeight)
+            height = max(int((i + 1) * laneHeight) - int(i * laneHeight), 1)
+            for b, e in zip(lane.begins[first:last].tolist(),
+                            lane.ends[first:last].tolist()):
+                x = int((b - begin) * scale)
+                qp.drawRect(x, y, max(int((e - begin) * scale) - x, 1),
+                            height)
+        qp.setPen(QPen(QColor(20, 20, 20), 1, Qt.SolidLine))
+        qp.setBrush(Qt.NoBrush)
+        qp.drawRect(0, 0, w - 1, h - 1)
         qp.end()
 
-    def drawWidget(self, qp):
-        MAX_CAPACITY = 8
-        OVER_CAPACITY = 10
-        font = QFont('Serif', 7, QFont.Light)
-        qp.setFont(font)
-        size = self.size()
-        w = size.width()
-        h = size.height()
-        step = int(round(w / 5))
-        till = int(((w / OVER_CAPACITY) * self.value))
-        full = int(((w / OVER_CAPACITY) * MAX_CAPACITY))
-
-        if self.value >= MAX_CAPACITY:
-            qp.setPen(QColor(255, 255, 255))
-            qp.setBrush(QColor(255, 255, 184))
-            qp.drawRect(0, 0, full, h)
-            qp.setPen(QColor(255, 175, 175))
-            qp.setBrush(QColor(255, 175, 175))
-            qp.drawRect(full, 0, till-full, h)
+    def paintEvent(self, e):
+        with span('LabelSliderWidget.paintEvent'):
+            if self.lanes is None:
+                self.buildLanes()
+            if self.layer is None or self.layer.size() != self.size():
+                self.renderLayer()
+            qp = QPainter()
+            qp.begin(self)
+            qp.drawPixmap(e.rect(), self.layer, e.rect())
+            x = self.xOf(self.value)
+            qp.setPen(QPen(QColor(255, 0, 0), 1, Qt.SolidLine))
+            qp.drawLine(x, 0, x, self.height())
+            qp.end()
+
+    def resizeEvent(self, e):
+        self.layer = None
+        super(LabelSliderWidget, self).resizeEvent(e)
+
+    def wheelEvent(self, e):
+        begin, span = self.view()
+        t = self.timeAt(e.pos().x())
+        steps = e.angleDelta().y() / 120
+        if e.modifiers() & Qt.ShiftModifier:
+            begin -= steps * span / 10
         else:
-            qp.setPen(QColor(255, 255, 255))
-            qp.setBrush(QColor(255, 255, 184))
-            qp.drawRect(0, 0, till, h)
-
-        pen = QPen(QColor(20, 20, 20), 1, Qt.SolidLine)
-        qp.setPen(pen)
-        qp.setBrush(Qt.NoBrush)
-        qp.drawRect(0, 0, w-1, h-1)
-        j = 0
-
-        for i in range(step, 5*step, step):
-            qp.drawLine(i, 0, i, 5)
-            metrics = qp.fontMetrics()
-            fw = metrics.width(str(self.num[j]))
-            qp.drawText(i-fw//2, h//2, str(self.num[j]))
-            j = j + 1
-
-
-class Example(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.initUI()
-
-    def initUI(self):
-        OVER_CAPACITY = 10
-        sld = QSlider(Qt.Horizontal, self)
-        sld.setFocusPolicy(Qt.NoFocus)
-        sld.setRange(0, OVER_CAPACITY)
-        sld.setValue(2)
-
-        self.c   = Communicate()
-        self.wid = BurningWidget()
-
-        self.c.updateBW[int].connect(self.wid.setValue)
-        sld.valueChanged[int].connect(self.changeValue)
-
-        hbox = QHBoxLayout()
-        hbox.addWidget(self.wid)
-        vbox = QVBoxLayout()
-        vbox.addStretch(1)
-        vbox.addWidget(sld)
-
-        vbox.addLayout(hbox)
-        self.setLayout(vbox)
-
-        self.setGeometry(500, 300, 390, 210)
-        self.setWindowTitle('Burning widget')
-
-    def changeValue(self, value):
-        self.c.updateBW.emit(value)
-        self.wid.repaint()
+            span = min(max(span * 0.8 ** steps, MIN_SPAN), self.extent())
+            begin = t - e.pos().x() * span / max(self.width(), 1)
+        self.viewBegin = max(0, min(begin, self.extent() - span))
+        self.viewSpan = None if span >= self.extent() else span
+        self.invalidateLayer()
+
+    def mouseDoubleClickEvent(self, e):
+        self.viewBegin = 0
+        self.viewSpan = None
+        self.invalidateLayer()
+
+    def mousePressEvent(self, e):
+        if e.button() == Qt.LeftButton:
+            self.clicked.emit(self.timeAt(e.pos().x()))
@@ -1,20 +1,31 @@
-from PyQt5.QtCore import QDir, Qt, QUrl, pyqtSlot, pyqtSignal, QCoreApplication, QTimer
-from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer
-from PyQt5.QtMultimediaWidgets import QVideoWidget
-from PyQt5.QtGui import QIcon, QKeySequence
+import time
+# origin of the time to first window
+STARTED = time.perf_counter_ns()
+
+from PyQt5.QtCore import QDir, Qt, QUrl, pyqtSlot, pyqtSignal, QCoreApplication, QTimer, QStandardPaths, QEvent
+from PyQt5.QtGui import QIcon, QKeySequence, QPixmap
 from PyQt5.QtWidgets import (QApplication, QFileDialog, QHBoxLayout,QLabel,
         QPushButton, QSizePolicy, QSlider,QStyle, QVBoxLayout, QWidget,
         QTableWidget, QTableWidgetItem,QMainWindow, QAction,
         QAbstractScrollArea, QShortcut, QMessageBox)
 
-from utils import create_action, format_time
+from utils import create_action
+from timecodec import format_time
 from label_creator import LabelCreatorWidget
 from label_editor import LabelEditorWidget
 from label_slider import LabelSliderWidget
 from signals import SignalBus
+from seek_scheduler import SeekScheduler
+from journal import Journal, read_csv, replay
+from project import save_project, load_project, ProjectError
+from store import open_store
+from video_queue import VideoQueue
+from label_matrix import export_matrix, frame_times
+from tracer import Tracer, StatsOverlay, span, trace_path
 
 import sys
 import os
+import multiprocessing
 import csv
 from functools import partial
 
@@ -25,6 +36,16 @@ try:
 except ImportError:
     pass
 
+# QtMultimedia loads the media backend when it is imported: it is only
+# imported, and the player created, once a video is opened
+QMediaContent = QMediaPlayer = QVideoWidget = None
+
+
+def import_multimedia():
+    global QMediaContent, QMediaPlayer, QVideoWidget
+    from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer
+    from PyQt5.QtMultimediaWidgets import QVideoWidget
+
 
 class QDoubleClickButton(QPushButton):
     doubleClicked = pyqtSignal()
@@ -46,6 +67,8 @@ class QDoubleClickButton(QPushButton):
             self.timer.start(250)
 
 class VideoWindow(QMainWindow):
+    # time to first window (ms)
+    started = pyqtSignal(float)
 
     def __init__(self, parent=None):
         super(VideoWindow, self).__init__(parent)
@@ -55,12 +78,28 @@ class VideoWindow(QMainWindow):
         self.comm.newLabelSignal.connect(self.bindLabelEvent)
         self.comm.delLabelSignal.connect(self.unbindLabelEvent)
         self.rate = 1
+        self.frameIndex = None
+        self.frameIndexer = None
+        self.filmstrip = None
+        self.filmstripWorker = None
+        self.journal = None
+        self.store = open_store()
+        self.queue = None
+        self.preloader = None
+        self.preloadedFile = None
+        self.clipExporter = None
+        self.startupTime = None
+        self.tracer = Tracer.instance()
         self.initUI()
         self.set_default_shortcuts()
         self.shortcuts = {}
+        if trace_path() is not None:
+            self.traceAction.setChecked(True)
+            self.startTrace(trace_path())
 
     def initUI(self):
         videoWidget = self.create_player()
+        self.videoWidget = videoWidget
         self.errorLabel = QLabel()
         self.errorLabel.setSizePolicy(QSizePolicy.Preferred,
                 QSizePolicy.Maximum)
@@ -68,17 +107,35 @@ class VideoWindow(QMainWindow):
         wid = QWidget(self)
         self.setCentralWidget(wid)
         self.set_layout(videoWidget, wid)
-        self.mediaPlayer.setVideoOutput(videoWidget)
-        self.mediaPlayer.stateChanged.connect(self.mediaStateChanged)
-        self.mediaPlayer.positionChanged.connect(self.positionChanged)
-        self.mediaPlayer.setNotifyInterval(100)
-        self.mediaPlayer.durationChanged.connect(self.durationChanged)
-        self.mediaPlayer.error.connect(self.handleError)
+        self.statsOverlay = StatsOverlay(self.tracer, wid)
+        self.statsOverlay.addCounter("seeks issued",
+                                     lambda: self.seeker.issued)
+        self.statsOverlay.addCounter("seeks dropped",
+                                     lambda: self.seeker.dropped)
+        self.autosaveTimer = QTimer(self)
+        self.autosaveTimer.timeout.connect(self.autosave)
+        self.autosaveTimer.start(30000)
+
+    def connectPlayer(self, player):
+        player.stateChanged.connect(self.mediaStateChanged)
+        player.positionChanged.connect(self.positionChanged)
+        player.setNotifyInterval(100)
+        player.durationChanged.connect(self.durationChanged)
+        player.error.connect(self.handleError)
+
+    def disconnectPlayer(self, player):
+        player.stateChanged.disconnect(self.mediaStateChanged)
+        player.positionChanged.disconnect(self.positionChanged)
+        player.durationChanged.disconnect(self.durationChanged)
+        player.error.disconnect(self.handleError)
 
     def create_player(self):
-        self.mediaPlayer = QMediaPlayer(None, QMediaPlayer.VideoSurface)
+        self.mediaPlayer = None
+        self.seeker = SeekScheduler(None, parent=self)
 
-        videoWidget = QVideoWidget()
+        # stands for the video until the player is created
+        videoWidget = QWidget()
+        videoWidget.setStyleSheet("background-color: black;")
         self.creatorWidget = LabelCreatorWidget()
         self.editorWidget = LabelEditorWidget(self, self.creatorWidget.groups)
         self.create_control()
@@ -87,16 +144,30 @@ class VideoWindow(QMainWindow):
         self.speedUpButton.clicked.connect(self.speed)
         self.slowDownButton.clicked.connect(self.slow)
         self.adv3Button.clicked.connect(partial(self.advance, 300))
-        self.adv1Button.clicked.connect(partial(self.advance, 100))
+        self.adv1Button.clicked.connect(partial(self.stepFrames, 1))
         self.goBack3Button.clicked.connect(partial(self.back, 300))
-        self.goBack1Button.clicked.connect(partial(self.back, 100))
+        self.goBack1Button.clicked.connect(partial(self.stepFrames, -1))
         self.advanceButton.clicked.connect(partial(self.advance, 5000))
         self.goBackButton.clicked.connect(partial(self.back, 5000))
-        self.positionSlider.sliderMoved.connect(self.setPosition)
+        self.positionSlider.sliderMoved.connect(self.dragPosition)
+        self.positionSlider.sliderReleased.connect(self.onSliderReleased)
         self.timeBox.doubleClicked.connect(self.onDoubleClickTimeBox)
 
         return videoWidget
 
+    def createMediaPlayer(self):
+        if self.mediaPlayer is not None:
+            return
+        import_multimedia()
+        self.mediaPlayer = QMediaPlayer(None, QMediaPlayer.VideoSurface)
+        self.seeker.player = self.mediaPlayer
+        videoWidget = QVideoWidget()
+        self.videoAreaLayout.replaceWidget(self.videoWidget, videoWidget)
+        self.videoWidget.deleteLater()
+        self.videoWidget = videoWidget
+        self.mediaPlayer.setVideoOutput(videoWidget)
+        self.connectPlayer(self.mediaPlayer)
+
     def set_default_shortcuts(self):
         self.playButton.setShortcut(QKeySequence(Qt.Key_Space))
         self.speedUpButton.setShortcut(QKeySequence(Qt.Key_Up))
@@ -163,12 +234,18 @@ class VideoWindow(QMainWindow):
         self.rateBox.setAlignment(Qt.AlignCenter)
 
         self.labelSlider = LabelSliderWidget()
+        self.labelSlider.setModel(self.editorWidget.model)
+        self.labelSlider.clicked.connect(self.setPosition)
 
         self.positionSlider = QSlider(Qt.Horizontal)
         self.positionSlider.setRange(0, 0)
+        self.positionSlider.setMouseTracking(True)
+        self.positionSlider.installEventFilter(self)
+
+        self.thumbnailLabel = QLabel(self, Qt.ToolTip)
 
     def onDoubleClickTimeBox(self):
-        position = self.mediaPlayer.position()
+        position = self.snap(self.mediaPlayer.position())
         self.editorWidget.updateSelectedTimestamp(position)
         self.editorWidget.highight_intersecting_items(position)
 
@@ -181,14 +258,55 @@ class VideoWindow(QMainWindow):
         csvImportAction = create_action('open.png', '&Import', 'Ctrl+I',
                                         'Import from csv',
                                         self.importCsv, self)
+        projectSaveAction = create_action('save.png', '&Save project',
+                                          'Ctrl+Shift+S',
+                                          'Save labels and marks to a project',
+                                          self.saveProject, self)
+        projectOpenAction = create_action('open.png', 'Open &project',
+                                          'Ctrl+Shift+O',
+                                          'Open labels and marks of a project',
+                                          self.openProject, self)
+        queueAction = create_action('open.png', 'Open &queue', 'Ctrl+Shift+Q',
+                                    'Label the videos of a directory',
+                                    self.openQueueDirectory, self)
+        manifestAction = create_action('open.png', 'Open queue &manifest',
+                                       'Ctrl+Shift+M',
+                                       'Label the videos listed in a file',
+                                       self.openQueueManifest, self)
+        self.nextVideoAction = create_action('open.png', '&Next video',
+                                             'Ctrl+N',
+                                             'Save the marks and open the next video of the queue',
+                                             self.nextVideo, self)
+        self.nextVideoAction.setEnabled(False)
+        clipsAction = create_action('save.png', 'Export &clips', 'Ctrl+E',
+                                    'Export each mark as a video clip',
+                                    self.exportClips, self)
+        matrixAction = create_action('save.png', 'Export label &matrix',
+                                     'Ctrl+Shift+E',
+                                     'Export the labels of each frame',
+                                     self.exportMatrix, self)
         exitAction = create_action('exit.png', '&Exit', 'Ctrl+Q', 'Exit',
                                    self.exitCall, self)
+        self.traceAction = create_action('', '&Trace hot paths',
+                                         'Ctrl+Shift+T',
+                                         'Time the hot paths and write a trace',
+                                         self.toggleTrace, self)
+        self.traceAction.setCheckable(True)
         menuBar = self.menuBar()
         fileMenu = menuBar.addMenu('&File')
         fileMenu.addAction(openAction)
+        fileMenu.addAction(queueAction)
+        fileMenu.addAction(manifestAction)
+        fileMenu.addAction(self.nextVideoAction)
         fileMenu.addAction(csvExportAction)
         fileMenu.addAction(csvImportAction)
+        fileMenu.addAction(projectSaveAction)
+        fileMenu.addAction(projectOpenAction)
+        fileMenu.addAction(clipsAction)
+        fileMenu.addAction(matrixAction)
         fileMenu.addAction(exitAction)
+        toolsMenu = menuBar.addMenu('&Tools')
+        toolsMenu.addAction(self.traceAction)
 
     def set_layout(self, videoWidget, wid):
         labellingLayout = QVBoxLayout()
@@ -207,6 +325,7 @@ class VideoWindow(QMainWindow):
         videoAreaLayout.addWidget(videoWidget, 5)
         videoAreaLayout.addLayout(controlLayout, 1)
         videoAreaLayout.addWidget(self.errorLabel)
+        self.videoAreaLayout = videoAreaLayout
 
         layout = QHBoxLayout()
         layout.addLayout(videoAreaLayout, 3)
@@ -252,22 +371,280 @@ class VideoWindow(QMainWindow):
                                                   self.tr("Media File (*.mp4 *.avi *.ogv)"))
 
         if fileName != '':
+            self.setQueue(None)
+            self.loadVideo(fileName)
+
+    def openQueueDirectory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Open queue",
+                                                     QDir.homePath())
+        if directory != '':
+            self.startQueue(VideoQueue.fromDirectory(directory))
+
+    def openQueueManifest(self):
+        fileName, _ = QFileDialog.getOpenFileName(self, "Open queue manifest",
+                                                  QDir.homePath(),
+                                                  "Manifest (*.txt *.csv)")
+        if fileName != '':
+            try:
+                self.startQueue(VideoQueue.fromManifest(fileName))
+            except (OSError, csv.Error) as e:
+                self.errorLabel.setText("Error: " + str(e))
+
+    def startQueue(self, queue):
+        if len(queue) == 0:
+            self.errorLabel.setText("Error: no video in the queue")
+            return
+        self.saveMarks()
+        self.setQueue(queue)
+        self.loadVideo(queue.current())
+
+    def setQueue(self, queue):
+        self.queue = queue
+        self.nextVideoAction.setEnabled(queue is not None)
+        if queue is None and self.preloader is not None:
+            self.preloader.setMedia(QMediaContent())
+            self.preloadedFile = None
+
+    def nextVideo(self):
+        if self.queue is None or self.queue.next() is None:
+            self.errorLabel.setText("End of the queue")
+            return
+        self.saveMarks()
+        self.loadVideo(self.queue.advance())
+
+    def saveMarks(self):
+        # the marks of the opened video go to its csv file, and the table is
+        # emptied for the next video
+        if not hasattr(self, "openedFile"):
+            return
+        self.syncStore(self.getCSVPath())
+        if self.journal is not None:
+            self.compactJournal()
+            self.closeJournal()
+        else:
+            try:
+                self.writeMarks(self.getCSVPath())
+            except OSError as e:
+                self.errorLabel.setText("Error: " + str(e))
+        self.editorWidget.removeAllMarks()
+
+    def preloadNext(self):
+        # the next video of the queue is loaded by a second player, and
+        # paused on its first frame once loaded
+        nextFile = self.queue.next() if self.queue is not None else None
+        if nextFile is None or nextFile == self.preloadedFile:
+            return
+        if self.preloader is None:
+            self.preloader = QMediaPlayer(None, QMediaPlayer.VideoSurface)
+            self.preloader.mediaStatusChanged.connect(self.onPreloadStatus)
+        self.preloadedFile = nextFile
+        self.preloader.setMedia(QMediaContent(QUrl.fromLocalFile(nextFile)))
+
+    def onPreloadStatus(self, status):
+        if status == QMediaPlayer.LoadedMedia and \
+                self.preloader.state() == QMediaPlayer.StoppedState:
+            self.preloader.pause()
+
+    def swapPlayers(self):
+        # the preloaded player becomes the one on screen
+        self.mediaPlayer.stop()
+        self.disconnectPlayer(self.mediaPlayer)
+        self.preloader.mediaStatusChanged.disconnect(self.onPreloadStatus)
+        self.mediaPlayer, self.preloader = self.preloader, self.mediaPlayer
+        self.preloader.mediaStatusChanged.connect(self.onPreloadStatus)
+        self.preloader.setMedia(QMediaContent())
+        self.preloadedFile = None
+        self.mediaPlayer.setVideoOutput(self.videoWidget)
+        self.connectPlayer(self.mediaPlayer)
+        self.seeker.player = self.mediaPlayer
+        self.mediaStateChanged(self.mediaPlayer.state())
+        self.durationChanged(self.mediaPlayer.duration())
+        self.positionChanged(self.mediaPlayer.position())
+
+    def loadVideo(self, fileName):
+        self.createMediaPlayer()
+        fileName = os.path.abspath(fileName)
+        if fileName == self.preloadedFile:
+            self.swapPlayers()
+        else:
             self.mediaPlayer.setMedia(
                     QMediaContent(QUrl.fromLocalFile(fileName)))
-            self.absOpenedFile = os.path.abspath(fileName)
-            self.openedFile = os.path.basename(fileName)
-            self.setWindowTitle("tofu - " + self.openedFile)
-            self.playButton.setEnabled(True)
-            self.speedUpButton.setEnabled(True)
-            self.slowDownButton.setEnabled(True)
-            self.advanceButton.setEnabled(True)
-            self.adv3Button.setEnabled(True)
-            self.adv1Button.setEnabled(True)
-            self.goBackButton.setEnabled(True)
-            self.goBack3Button.setEnabled(True)
-            self.goBack1Button.setEnabled(True)
-            self.timeBox.setEnabled(True)
-            self.rate = 1
+        self.errorLabel.setText("")
+        self.absOpenedFile = fileName
+        self.openedFile = os.path.basename(fileName)
+        title = "tofu - " + self.openedFile
+        if self.queue is not None:
+            title += " (%d/%d)" % (self.queue.position + 1,
+                                   len(self.queue))
+        self.setWindowTitle(title)
+        self.playButton.setEnabled(True)
+        self.speedUpButton.setEnabled(True)
+        self.slowDownButton.setEnabled(True)
+        self.advanceButton.setEnabled(True)
+        self.adv3Button.setEnabled(True)
+        self.adv1Button.setEnabled(True)
+        self.goBackButton.setEnabled(True)
+        self.goBack3Button.setEnabled(True)
+        self.goBack1Button.setEnabled(True)
+        self.timeBox.setEnabled(True)
+        self.rate = 1
+        self.openJournal()
+        self.indexFrames(self.absOpenedFile)
+        self.makeFilmstrip(self.absOpenedFile)
+        self.preloadNext()
+
+    def indexFrames(self, fileName):
+        # until the index is built, the player steps by fixed durations
+        self.frameIndex = None
+        self.seeker.reset()
+        self.setStepToolTips("0.1 second")
+        cacheDir = os.path.join(QStandardPaths.writableLocation(
+            QStandardPaths.CacheLocation), 'frames')
+        # imported here, along with ffmpeg, to keep it out of the start
+        from frame_index import FrameIndexer
+        self.stopFrameIndexer()
+        self.frameIndexer = FrameIndexer(fileName, cacheDir, self)
+        self.frameIndexer.indexed.connect(self.onFramesIndexed)
+        self.frameIndexer.failed.connect(self.onWorkerFailed)
+        self.frameIndexer.start()
+
+    def stopFrameIndexer(self):
+        # ffprobe is killed, the thread ends at once
+        if self.frameIndexer is not None:
+            self.frameIndexer.stop()
+            self.frameIndexer.wait()
+
+    def onWorkerFailed(self, message):
+        self.errorLabel.setText("Error: " + message)
+
+    def onFramesIndexed(self, fileName, index):
+        # ignore the index of a video that is not opened anymore
+        if fileName == self.absOpenedFile:
+            self.frameIndex = index
+            self.seeker.reset(index)
+            self.setStepToolTips("1 frame")
+
+    def openJournal(self):
+        # every edit of the marks is appended to the journal of the video.
+        # The marks of the video are loaded from its journal, replaying the
+        # edits of a session which did not end, or else from its csv file.
+        self.closeJournal()
+        path = self.getJournalPath()
+        csvPath = self.getCSVPath()
+        recovered = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            marks, recovered = replay(path, csvPath)
+            self.editorWidget.load_marks(*marks)
+        elif os.path.exists(csvPath):
+            self.editorWidget.load_marks(*read_csv(csvPath))
+            self.editorWidget.onSortItems()
+        else:
+            # a new video: the marks of the previous one are not its own
+            self.editorWidget.removeAllMarks()
+        try:
+            self.journal = Journal(path, csvPath)
+            if recovered:
+                self.journal.compact(self.editorWidget.get_marks())
+                self.statusBar().showMessage(
+                    "Recovered %d edits of the marks" % recovered, 5000)
+            elif os.path.exists(csvPath):
+                self.journal.recordBase()
+            else:
+                self.journal.record('reset')
+        except OSError as e:
+            # a video in a read-only directory, for instance
+            self.dropJournal(e)
+            return
+        # loading the marks is not an edit to save
+        self.journal.count = 0
+        self.editorWidget.model.journal = self.journal
+
+    def closeJournal(self):
+        self.autosave()
+        if self.journal is not None:
+            self.editorWidget.model.journal = None
+            self.journal.close()
+            self.journal = None
+
+    def dropJournal(self, error):
+        # the marks are still edited, without a journal
+        self.errorLabel.setText("Error: no journal of the marks: "
+                                + str(error))
+        self.editorWidget.model.journal = None
+        if self.journal is not None:
+            try:
+                self.journal.close()
+            except OSError:
+                pass
+            self.journal = None
+
+    def compactJournal(self, marks=None):
+        if marks is None:
+            marks = self.editorWidget.get_marks()
+        try:
+            self.journal.compact(marks)
+        except OSError as e:
+            self.dropJournal(e)
+
+    def autosave(self):
+        if self.journal is not None and self.journal.count > 0:
+            self.compactJournal()
+
+    def makeFilmstrip(self, fileName):
+        self.stopFilmstrip()
+        self.filmstrip = None
+        from filmstrip import FilmstripWorker
+        self.filmstripWorker = FilmstripWorker(fileName,
+                                               self.getThumbnailsPath(), self)
+        self.filmstripWorker.ready.connect(self.onFilmstripReady)
+        self.filmstripWorker.failed.connect(self.onWorkerFailed)
+        self.filmstripWorker.start()
+
+    def stopFilmstrip(self):
+        if self.filmstripWorker is not None:
+            self.filmstripWorker.requestInterruption()
+            self.filmstripWorker.wait()
+
+    def onFilmstripReady(self, fileName, filmstrip):
+        if fileName == self.absOpenedFile:
+            self.filmstrip = filmstrip
+
+    def eventFilter(self, source, event):
+        # thumbnail of the position under the cursor, on hover and drag
+        if source is self.positionSlider:
+            if event.type() == QEvent.MouseMove:
+                position = QStyle.sliderValueFromPosition(
+                    source.minimum(), source.maximum(), event.pos().x(),
+                    source.width())
+                self.showThumbnail(position, event.globalPos().x())
+            elif event.type() == QEvent.Leave:
+                self.thumbnailLabel.hide()
+        return super(VideoWindow, self).eventFilter(source, event)
+
+    def showThumbnail(self, position, x):
+        image = None
+        if self.filmstrip is not None:
+            image = self.filmstrip.thumbnail(position)
+        if image is None:
+            self.thumbnailLabel.hide()
+            return
+        self.thumbnailLabel.setPixmap(QPixmap.fromImage(image))
+        self.thumbnailLabel.adjustSize()
+        top = self.positionSlider.mapToGlobal(
+            self.positionSlider.rect().topLeft()).y()
+        self.thumbnailLabel.move(x - image.width() // 2,
+                                 top - image.height() - 4)
+        self.thumbnailLabel.show()
+
+    def setStepToolTips(self, step):
+        self.adv1Button.setToolTip("> " + step)
+        self.goBack1Button.setToolTip("< " + step)
+
+    def snap(self, position):
+        # beginning of the frame shown at position
+        if self.frameIndex is None:
+            return position
+        return self.frameIndex.snap(position)
 
     def exitCall(self):
         # TODO Force export before Quit
@@ -282,8 +659,57 @@ class VideoWindow(QMainWindow):
             self.exportCsv()
         else:
             print("Exit")
+        self.stopFrameIndexer()
+        self.stopFilmstrip()
+        if self.clipExporter is not None:
+            self.clipExporter.wait()
+        if self.journal is not None:
+            self.editorWidget.model.journal = None
+            self.journal.close()
+            self.journal = None
+        if self.tracer.enabled:
+            self.stopTrace()
         QCoreApplication.quit()
 
+    def showEvent(self, event):
+        super(VideoWindow, self).showEvent(event)
+        if self.startupTime is None:
+            # runs once the events of the first show are processed
+            QTimer.singleShot(0, self.onFirstShown)
+
+    def onFirstShown(self):
+        if self.startupTime is not None:
+            return
+        now = time.perf_counter_ns()
+        self.startupTime = (now - STARTED) / 1e6
+        if self.tracer.enabled:
+            self.tracer.add('startup', STARTED, now)
+        self.started.emit(self.startupTime)
+
+    def toggleTrace(self, checked):
+        if checked:
+            # a trace per session when it is not named by TOFU_TRACE
+            path = trace_path() or os.path.join(
+                QStandardPaths.writableLocation(
+                    QStandardPaths.AppLocalDataLocation), 'traces',
+                time.strftime('trace-%Y%m%d-%H%M%S.json'))
+            self.startTrace(path)
+        elif self.tracer.enabled:
+            self.stopTrace()
+
+    def startTrace(self, path):
+        self.tracer.start(path)
+        self.statsOverlay.start()
+
+    def stopTrace(self):
+        self.statsOverlay.stop()
+        try:
+            path = self.tracer.stop()
+        except OSError as e:
+            self.errorLabel.setText("Error: " + str(e))
+            return
+        self.statusBar().showMessage("Trace written to " + path, 5000)
+
     def play(self):
         if self.mediaPlayer.state() == QMediaPlayer.PlayingState:
             self.mediaPlayer.pause()
@@ -319,14 +745,24 @@ class VideoWindow(QMainWindow):
             self.rateBox.setText(str(self.rate)+'x')
 
     def advance(self, t=10000):
-        currentPos = self.mediaPlayer.position()
+        currentPos = self.seeker.position()
         nextPos = currentPos + t
-        self.setPosition(nextPos)
+        self.setPosition(self.snap(nextPos))
 
     def back(self, t=10000):
-        currentPos = self.mediaPlayer.position()
+        currentPos = self.seeker.position()
         nextPos = max(currentPos - t, 0)
-        self.setPosition(nextPos)
+        self.setPosition(self.snap(nextPos))
+
+    def stepFrames(self, frames):
+        if self.frameIndex is None:
+            if frames > 0:
+                self.advance(100 * frames)
+            else:
+                self.back(-100 * frames)
+        else:
+            currentPos = self.seeker.position()
+            self.setPosition(self.frameIndex.step(currentPos, frames))
 
     def mediaStateChanged(self, state):
         if self.mediaPlayer.state() == QMediaPlayer.PlayingState:
@@ -337,15 +773,25 @@ class VideoWindow(QMainWindow):
                     self.style().standardIcon(QStyle.SP_MediaPlay))
 
     def positionChanged(self, position):
-        self.positionSlider.setValue(position)
-        self.timeBox.setText(format_time(position))
-        self.editorWidget.highight_intersecting_items(position)
+        with span('positionChanged'):
+            self.seeker.reached(position)
+            self.positionSlider.setValue(position)
+            self.labelSlider.setValue(position)
+            self.timeBox.setText(format_time(position))
+            self.editorWidget.highight_intersecting_items(position)
 
     def durationChanged(self, duration):
         self.positionSlider.setRange(0, duration)
+        self.labelSlider.setDuration(duration)
 
     def setPosition(self, position):
-        self.mediaPlayer.setPosition(position)
+        self.seeker.seek(position)
+
+    def dragPosition(self, position):
+        self.seeker.seek(position, fast=True)
+
+    def onSliderReleased(self):
+        self.seeker.seek(self.positionSlider.value())
 
     def handleError(self):
         self.playButton.setEnabled(False)
@@ -355,20 +801,32 @@ class VideoWindow(QMainWindow):
         self.goBackButton.setEnabled(False)
         self.errorLabel.setText("Error: " + self.mediaPlayer.errorString())
 
-    def bindLabelEvent(self, keySeq, label):
-        bind = QAction(label, self)
+    def bindLabelEvent(self, keySeq, lid):
+        # a label has a single shortcut, the last one bound
+        if lid in self.shortcuts:
+            self.unbindLabelEvent(lid)
+        bind = QAction(self.creatorWidget.groups.labelNames[lid], self)
         bind.setShortcut(keySeq)
-        bind.triggered.connect(partial(self.createMark, label))
-        self.shortcuts[keySeq.toString()] = bind
+        bind.triggered.connect(partial(self.createMark, lid))
+        self.shortcuts[lid] = bind
         self.addAction(bind)
 
-    def unbindLabelEvent(self, keySeqStr):
-        self.removeAction(self.shortcuts[keySeqStr])
-        del self.shortcuts[keySeqStr]
+    def unbindLabelEvent(self, lid):
+        if lid in self.shortcuts:
+            self.removeAction(self.shortcuts.pop(lid))
 
     def getCSVPath(self):
         return os.path.splitext(self.absOpenedFile)[0] + '.csv'
 
+    def getProjectPath(self):
+        return os.path.splitext(self.absOpenedFile)[0] + '.tofu'
+
+    def getJournalPath(self):
+        return os.path.splitext(self.absOpenedFile)[0] + '.journal'
+
+    def getThumbnailsPath(self):
+        return os.path.splitext(self.absOpenedFile)[0] + '.thumbs'
+
     def importCsv(self):
         if hasattr(self, "openedFile"):
             suggestedName = QUrl.fromLocalFile(self.getCSVPath())
@@ -380,11 +838,12 @@ class VideoWindow(QMainWindow):
         fileName = fileUrl.toLocalFile()
 
         if fileName != '':
-            with open(fileName, mode='r') as csv_file:
+            with span('import csv'), open(fileName, mode='r') as csv_file:
                 labels = csv.reader(csv_file, delimiter=',', quotechar='"',
                                     quoting=csv.QUOTE_MINIMAL)
                 self.editorWidget.set_marks(labels)
                 self.editorWidget.onSortItems()
+            self.syncStore(fileName)
 
     def exportCsv(self):
         if hasattr(self, "openedFile"):
@@ -398,25 +857,154 @@ class VideoWindow(QMainWindow):
         fileName = fileUrl.toLocalFile()
 
         if fileName != '':
-            with open(fileName, mode='w', newline='') as csv_file:
-                writer = csv.writer(csv_file, delimiter=',', quotechar='"',
-                                    quoting=csv.QUOTE_MINIMAL)
-                marks = self.editorWidget.get_marks()
-                writer.writerows(marks)
+            marks = self.editorWidget.get_marks()
+            self.syncStore(fileName)
+            if self.journal is not None and \
+                    os.path.abspath(fileName) == self.getCSVPath():
+                # the journal is folded into the exported file
+                with span('export csv'):
+                    self.compactJournal(marks)
+                return
+            self.writeMarks(fileName, marks)
+
+    def writeMarks(self, fileName, marks=None):
+        if marks is None:
+            marks = self.editorWidget.get_marks()
+        with span('export csv'), \
+                open(fileName, mode='w', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=',', quotechar='"',
+                                quoting=csv.QUOTE_MINIMAL)
+            writer.writerows(marks)
+
+    def exportClips(self):
+        if not hasattr(self, "openedFile"):
+            return
+        if self.clipExporter is not None and self.clipExporter.isRunning():
+            self.errorLabel.setText("Clips are being exported")
+            return
+        outputDir = QFileDialog.getExistingDirectory(
+            self, "Export clips", os.path.splitext(self.absOpenedFile)[0])
+        if outputDir != '':
+            from clip_export import ClipExporter
+            self.clipExporter = ClipExporter(self.absOpenedFile,
+                                             self.editorWidget.get_marks(),
+                                             outputDir, self.frameIndex, self)
+            self.clipExporter.progress.connect(self.onClipsProgress)
+            self.clipExporter.exported.connect(self.onClipsExported)
+            self.clipExporter.start()
+
+    def exportMatrix(self):
+        if not hasattr(self, "openedFile"):
+            return
+        suggestedName = QUrl.fromLocalFile(
+            os.path.splitext(self.absOpenedFile)[0] + '.npz')
+        fileUrl, _ = QFileDialog.getSaveFileUrl(self, "Export label matrix",
+                                                suggestedName,
+                                                "NumPy (*.npz)")
+        fileName = fileUrl.toLocalFile()
+
+        if fileName != '':
+            # the frames of the video if they are indexed, else 25 per second
+            if self.frameIndex is not None:
+                times = self.frameIndex.times
+            else:
+                times = frame_times(self.mediaPlayer.duration(), 25)
+            m = self.editorWidget.model
+            groups = {name: label.group for name, label
+                      in self.creatorWidget.groups.labels.items()}
+            with span('export matrix'):
+                export_matrix(fileName, [m.labelNames[l] for l in m.labelIds],
+                              m.begins, m.ends, times, groups)
+
+    def onClipsProgress(self, done, total):
+        self.statusBar().showMessage("Exporting clips: %d/%d" % (done, total))
+
+    def onClipsExported(self, failed):
+        if failed:
+            self.errorLabel.setText("Error: %d clips not exported, first: %s"
+                                    % (len(failed), failed[0][1]))
+        self.statusBar().showMessage("Clips exported", 5000)
+
+    def syncStore(self, csvFileName):
+        # the marks of the opened video, or else of the csv file, replace
+        # their previous version in the store
+        if self.store is None:
+            return
+        if hasattr(self, "openedFile"):
+            path = self.absOpenedFile
+        else:
+            path = csvFileName
+        m = self.editorWidget.model
+        self.store.replaceMarks(path, [m.labelNames[l] for l in m.labelIds],
+                                m.begins, m.ends)
+
+    def saveProject(self):
+        if hasattr(self, "openedFile"):
+            suggestedName = QUrl.fromLocalFile(self.getProjectPath())
+        else:
+            suggestedName = QUrl.fromLocalFile(QDir.homePath())
+
+        fileUrl, _ = QFileDialog.getSaveFileUrl(self, "Save project",
+                                                suggestedName,
+                                                "Project (*.tofu)")
+        fileName = fileUrl.toLocalFile()
+
+        if fileName != '':
+            m = self.editorWidget.model
+            with span('save project'):
+                save_project(fileName, self.creatorWidget.getLabels(),
+                             m.labelNames, m.labelIds, m.begins, m.ends)
+
+    def openProject(self):
+        if hasattr(self, "openedFile"):
+            suggestedName = QUrl.fromLocalFile(self.getProjectPath())
+        else:
+            suggestedName = QUrl.fromLocalFile(QDir.homePath())
+
+        fileUrl, _ = QFileDialog.getOpenFileUrl(self, "Open project",
+                                                suggestedName,
+                                                "Project (*.tofu)")
+        fileName = fileUrl.toLocalFile()
+
+        if fileName != '':
+            with span('open project'):
+                try:
+                    definitions, labelNames, labelIds, begins, ends = \
+                        load_project(fileName)
+                except (OSError, ValueError, ProjectError) as e:
+                    self.errorLabel.setText("Error: " + str(e))
+                    return
+                self.creatorWidget.updateLabels(definitions)
+                self.editorWidget.load_mark_ids(labelNames, labelIds, begins,
+                                                ends)
+                self.editorWidget.onSortItems()
 
     @pyqtSlot()
-    def createMark(self, label):
+    def createMark(self, lid):
+        if self.mediaPlayer is None:
+            return
         state = self.mediaPlayer.state()
         if state == QMediaPlayer.PlayingState or state == \
                 QMediaPlayer.PausedState:
-            self.editorWidget.new_mark(self.mediaPlayer.position(), label)
+            self.editorWidget.new_mark(self.snap(self.mediaPlayer.position()),
+                                       lid)
 
 
 if __name__ == '__main__':
+    # the workers of the clip export start the frozen executable again
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     # app.setWindowIcon(QIcon('tofu.ico'))
     player = VideoWindow()
     player.resize(940, 480)
     player.show()
-    app.aboutToQuit.connect(player.exitCall)
+    if os.environ.get('TOFU_STARTUP_EXIT'):
+        # measures the cold start, see utils/benchmark.py --startup
+        player.started.connect(
+            lambda ms: print("startup %.1f ms" % ms, flush=True))
+        player.started.connect(app.quit)
+        if player.tracer.enabled:
+            app.aboutToQuit.connect(player.stopTrace)
+    else:
+        app.aboutToQuit.connect(player.exitCall)
     sys.exit(app.exec())
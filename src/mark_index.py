@@ -0,0 +1,130 @@
+from bisect import bisect_left, bisect_right
+import sys
+
+import numpy as np
+
+from marks_model import FLAG_INVALID
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+class MarkIndex:
+    # Sorted rows of the marks of each label, and of each group of labels,
+    # of a MarksModel. The rows of the model are sorted by begin, and so are
+    # the rows of a label or a group, which a time window narrows down by
+    # binary search. The index follows the changes of the model row by row,
+    # each in a few vectorized operations, and is only rebuilt when the
+    # model is reset (or regrouped when the groups change).
+
+    def __init__(self, model, groups):
+        self.model = model
+        self.groups = groups
+        self.rebuild()
+
+    def rebuild(self):
+        ids = np.array(self.model.labelIds, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        bounds = np.searchsorted(ids[order],
+                                 np.arange(len(self.model.labelNames) + 1))
+        self.byLabel = {lid: order[bounds[lid]:bounds[lid + 1]]
+                        for lid in range(len(self.model.labelNames))
+                        if bounds[lid] < bounds[lid + 1]}
+        self.regroup()
+
+    def regroup(self):
+        members = {}
+        for lid, rows in self.byLabel.items():
+            members.setdefault(self.__group(lid), []).append(rows)
+        self.byGroup = {group: np.sort(np.concatenate(rows))
+                        for group, rows in members.items()}
+
+    def __group(self, lid):
+        return self.groups.getGroupName(self.model.labelNames[lid])
+
+    def __shift(self, row, delta):
+        # renumbers the rows from row on
+        for rows in list(self.byLabel.values()) + list(self.byGroup.values()):
+            rows[rows >= row] += delta
+
+    @staticmethod
+    def __added(index, key, row):
+        rows = index.get(key, EMPTY)
+        index[key] = np.insert(rows, np.searchsorted(rows, row), row)
+
+    @staticmethod
+    def __discarded(index, key, row):
+        rows = index[key]
+        index[key] = np.delete(rows, np.searchsorted(rows, row))
+
+    def __add(self, row, lid):
+        self.__added(self.byLabel, lid, row)
+        self.__added(self.byGroup, self.__group(lid), row)
+
+    def __discard(self, row):
+        # returns the label of the row
+        for lid, rows in self.byLabel.items():
+            i = np.searchsorted(rows, row)
+            if i < len(rows) and rows[i] == row:
+                self.__discarded(self.byLabel, lid, row)
+                self.__discarded(self.byGroup, self.__group(lid), row)
+                return lid
+        return None
+
+    def insert(self, row):
+        self.__shift(row, 1)
+        self.__add(row, self.model.labelIds[row])
+
+    def remove(self, row):
+        self.__discard(row)
+        self.__shift(row + 1, -1)
+
+    def move(self, row, newRow):
+        # the mark at row is now at newRow
+        lid = self.__discard(row)
+        self.__shift(row + 1, -1)
+        self.__shift(newRow, 1)
+        self.__add(newRow, lid)
+
+    def relabel(self, row):
+        self.__discard(row)
+        self.__add(row, self.model.labelIds[row])
+
+    # The rows returned are copies, sorted.
+
+    def labelRows(self, label):
+        lid = self.model.labelIdx.get(label)
+        return self.byLabel.get(lid, EMPTY).copy()
+
+    def groupRows(self, group):
+        return self.byGroup.get(group, EMPTY).copy()
+
+    def window(self, rows, begin=None, end=None):
+        # the rows, among rows (all if None), of the marks which overlap
+        # [begin, end], unbounded if None. Only the marks beginning in
+        # [begin - longest mark, end] and the open ones are looked at.
+        m = self.model
+        begin = 0 if begin is None else begin
+        end = sys.maxsize if end is None else end
+        lengths = m.intervals.lengths
+        lo = bisect_left(m.begins, begin - (lengths[-1] if lengths else 0))
+        hi = bisect_right(m.begins, end)
+        if rows is None:
+            candidates = np.arange(lo, hi)
+        else:
+            candidates = rows[np.searchsorted(rows, lo):
+                              np.searchsorted(rows, hi)]
+        ends = np.array(m.ends, dtype=np.int64)
+        closed = candidates[ends[candidates] >= begin]
+        opened = np.array([r for r in m.intervals.opened
+                           if m.begins[r] <= end], dtype=np.int64)
+        if rows is not None:
+            opened = np.intersect1d(opened, rows)
+        return np.union1d(closed, opened)
+
+    def validity(self, rows, invalid):
+        # the rows, among rows (all if None), of the invalid marks, or of
+        # the valid ones
+        flags = np.array(self.model.states, dtype=np.uint8)
+        if rows is None:
+            rows = np.arange(len(flags))
+        return rows[((flags[rows] & FLAG_INVALID) != 0) == invalid]
@@ -0,0 +1,378 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from timecodec import format_time, str_to_ms
+from interval_index import IntervalIndex, OPEN_END
+from validation import GroupValidator
+
+# bits of the flags column
+FLAG_OPEN = 1      # the mark is being recorded by its shortcut
+FLAG_INVALID = 2   # the mark breaks a constraint of its group
+FLAG_ACTIVE = 4    # the mark covers the current position of the player
+
+# end of the marks without end ('...')
+NO_END = -1
+
+# roles of the changes of data: the text of the cells (and the order of
+# the marks), their validity, or only their state (open, active)
+TEXT_ROLES = [Qt.DisplayRole, Qt.EditRole]
+VALIDITY_ROLES = [Qt.ForegroundRole]
+STATE_ROLES = [Qt.BackgroundRole]
+
+
+class MarksModel(QAbstractTableModel):
+    # Marks stored as columns: begin and end in ms, interned label ids,
+    # state flags and keys, the ids of the marks which do not change when
+    # rows are inserted, removed or moved. Text is only produced by data(),
+    # for the visible cells.
+    # The rows are always sorted by begin (in insertion order for equal
+    # begins): a new mark is inserted at its place, and a mark whose begin
+    # is edited is moved to its new place. Other orders are left to the
+    # view, see sort_proxy.MarksSortProxy.
+
+    HEADERS = ['label', 'begin', 'end', '']
+
+    # the labels or timestamps changed, not only the state of the marks
+    marksChanged = pyqtSignal()
+
+    def __init__(self, groups):
+        super(MarksModel, self).__init__()
+        self.begins = array('q')
+        self.ends = array('q')
+        self.labelIds = array('l')
+        self.states = array('B')
+        self.keys = array('q')
+        self.nextKey = 0
+        # the label ids are those of groups
+        self.groups = groups
+        self.labelNames = groups.labelNames
+        self.labelIdx = groups.labelIdx
+        # label id -> row of its mark being recorded (FLAG_OPEN)
+        self.openRows = {}
+        self.intervals = IntervalIndex()
+        self.validator = GroupValidator(groups)
+        self.highlighted = set()
+        # records the edits of the marks, see journal.Journal
+        self.journal = None
+        self.active_color = QColor(64, 249, 107)
+        self.error_color = QColor(255, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.begins)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() == 3:
+            return Qt.ItemIsEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        row = index.row()
+        col = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if col == 0:
+                return self.labelName(row)
+            elif col == 1:
+                return format_time(self.begins[row])
+            elif col == 2:
+                end = self.ends[row]
+                return '...' if end == NO_END else format_time(end)
+        elif role == Qt.BackgroundRole:
+            if col == 0 and self.states[row] & FLAG_ACTIVE:
+                return self.active_color
+            if col in (1, 2) and self.states[row] & FLAG_OPEN:
+                return self.active_color
+        elif role == Qt.ForegroundRole:
+            if col == 0 and self.states[row] & FLAG_INVALID:
+                return self.error_color
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        row = index.row()
+        col = index.column()
+        if col == 0:
+            self.setLabel(row, str(value))
+            return True
+        if col == 2 and value == '...':
+            self.setEnd(row, NO_END)
+            return True
+        try:
+            ms = str_to_ms(value)
+        except ValueError:
+            return False
+        if ms < 0:
+            return False
+        if col == 1:
+            self.setBegin(row, ms)
+        elif col == 2:
+            self.setEnd(row, ms)
+        return True
+
+    def internLabel(self, label):
+        return self.groups.internLabel(label)
+
+    def labelName(self, row):
+        return self.labelNames[self.labelIds[row]]
+
+    def interval(self, row):
+        end = self.ends[row]
+        return (self.begins[row], OPEN_END if end == NO_END else end)
+
+    def mark(self, row):
+        return (self.labelName(row), self.begins[row], self.ends[row])
+
+    def __columns(self):
+        return (self.begins, self.ends, self.labelIds, self.states, self.keys)
+
+    def openRow(self, lid):
+        # the row of the mark of the label id being recorded, or -1
+        return self.openRows.get(lid, -1)
+
+    def insertMark(self, label, begin, end=NO_END, flags=0):
+        # inserted after the marks beginning before or at begin
+        row = bisect_right(self.begins, begin)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.begins.insert(row, begin)
+        self.ends.insert(row, end)
+        self.labelIds.insert(row, self.internLabel(label))
+        self.states.insert(row, flags)
+        self.keys.insert(row, self.nextKey)
+        self.nextKey += 1
+        self.intervals.insert(row, *self.interval(row))
+        self.validator.insert(self.keys[row], self.labelIds[row],
+                              *self.interval(row))
+        self.highlighted = {r if r < row else r + 1 for r in self.highlighted}
+        self.openRows = {l: r if r < row else r + 1
+                         for l, r in self.openRows.items()}
+        if flags & FLAG_OPEN:
+            self.openRows[self.labelIds[row]] = row
+        self.endInsertRows()
+        self.marksChanged.emit()
+        self.__record('insert', row, label, begin, end)
+        return row
+
+    def removeMark(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.intervals.remove(row, *self.interval(row))
+        self.validator.remove(self.keys[row])
+        for column in self.__columns():
+            del column[row]
+        self.highlighted = {r if r < row else r - 1
+                            for r in self.highlighted if r != row}
+        self.openRows = {l: r if r < row else r - 1
+                         for l, r in self.openRows.items() if r != row}
+        self.endRemoveRows()
+        self.marksChanged.emit()
+        self.__record('delete', row)
+
+    def __place(self, row):
+        # moves a row whose begin changed back to its place in the order,
+        # returns its new row
+        begin = self.begins[row]
+        if row > 0 and self.begins[row - 1] > begin:
+            newRow = bisect_right(self.begins, begin, 0, row)
+            destination = newRow
+        elif row + 1 < len(self.begins) and self.begins[row + 1] < begin:
+            newRow = bisect_left(self.begins, begin, row + 1) - 1
+            destination = newRow + 1
+        else:
+            return row
+        self.beginMoveRows(QModelIndex(), row, row, QModelIndex(),
+                           destination)
+        for column in self.__columns():
+            column.insert(newRow, column.pop(row))
+        self.intervals.move(row, newRow)
+        self.highlighted = {self.__moved(r, row, newRow)
+                            for r in self.highlighted}
+        self.openRows = {l: self.__moved(r, row, newRow)
+                         for l, r in self.openRows.items()}
+        self.endMoveRows()
+        self.__record('move', row, newRow)
+        return newRow
+
+    @staticmethod
+    def __moved(r, row, newRow):
+        # the new row of r once row is moved to newRow
+        if r == row:
+            return newRow
+        if row < r <= newRow:
+            return r - 1
+        if newRow <= r < row:
+            return r + 1
+        return r
+
+    def setMarks(self, labels, begins, ends):
+        # bulk load, e.g. from a csv file: one reset instead of one insertion
+        # per mark, indexes are built once
+        self.__load(array('l', map(self.internLabel, labels)), begins, ends)
+        if self.journal is not None:
+            self.journal.recordMarks(
+                [self.labelNames[l] for l in self.labelIds],
+                self.begins, self.ends)
+
+    def setMarkIds(self, labelNames, labelIds, begins, ends):
+        # bulk load of marks whose labels are indexes into labelNames, e.g.
+        # from a project file: the columns are copied as raw bytes
+        ids = np.array([self.internLabel(n) for n in labelNames],
+                       dtype=np.int64)[np.asarray(labelIds, dtype=np.int64)]
+        column = array('l')
+        column.frombytes(ids.astype('i%d' % column.itemsize).tobytes())
+        self.__load(column, begins, ends)
+        if self.journal is not None:
+            self.journal.recordMarks(
+                [self.labelNames[l] for l in self.labelIds],
+                self.begins, self.ends)
+
+    @staticmethod
+    def __int64s(values):
+        column = array('q')
+        column.frombytes(np.ascontiguousarray(values, dtype=np.int64)
+                         .tobytes())
+        return column
+
+    def __load(self, labelIds, begins, ends):
+        self.beginResetModel()
+        begins = np.asarray(begins, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if np.any(begins[1:] < begins[:-1]):
+            order = np.argsort(begins, kind='stable')
+            begins, ends = begins[order], ends[order]
+            ids = np.asarray(labelIds)[order]
+            labelIds = array(labelIds.typecode)
+            labelIds.frombytes(ids.tobytes())
+        self.begins = self.__int64s(begins)
+        self.ends = self.__int64s(ends)
+        self.labelIds = labelIds
+        self.states = array('B', bytes(len(self.begins)))
+        self.keys = self.__int64s(np.arange(self.nextKey,
+                                            self.nextKey + len(self.begins)))
+        self.nextKey += len(self.begins)
+        closed = ends != NO_END
+        self.intervals.rebuild((ends[closed] - begins[closed]).tolist(),
+                               np.flatnonzero(~closed).tolist())
+        self.validator.rebuild(
+            (key, lid, begin, OPEN_END if end == NO_END else end)
+            for key, lid, begin, end in zip(self.keys, self.labelIds,
+                                            self.begins, self.ends))
+        self.highlighted = set()
+        self.openRows = {}
+        self.endResetModel()
+        self.marksChanged.emit()
+
+    def clear(self):
+        self.beginResetModel()
+        for column in self.__columns():
+            del column[:]
+        self.intervals.clear()
+        self.validator.clear()
+        self.highlighted = set()
+        self.openRows = {}
+        self.endResetModel()
+        self.marksChanged.emit()
+        self.__record('reset')
+
+    def setLabel(self, row, label):
+        lid = self.labelIds[row]
+        self.labelIds[row] = self.internLabel(label)
+        if self.openRows.get(lid) == row:
+            # still recorded, by the shortcut of its new label
+            del self.openRows[lid]
+            self.openRows.setdefault(self.labelIds[row], row)
+        self.__validate(row)
+        self.__rowChanged(row, 0, 0, TEXT_ROLES)
+        self.marksChanged.emit()
+        self.__record('label', row, label)
+
+    def setBegin(self, row, begin):
+        # returns the row of the mark, moved to keep the order
+        old = self.interval(row)
+        self.begins[row] = begin
+        self.__timestampChanged(row, old)
+        self.__record('begin', row, begin)
+        return self.__place(row)
+
+    def setEnd(self, row, end):
+        old = self.interval(row)
+        self.ends[row] = end
+        self.__timestampChanged(row, old)
+        self.__record('end', row, end)
+
+    def setFlag(self, row, flag, on):
+        if on:
+            self.states[row] |= flag
+        else:
+            self.states[row] &= ~flag
+        if flag & FLAG_OPEN:
+            lid = self.labelIds[row]
+            if on:
+                self.openRows[lid] = row
+            elif self.openRows.get(lid) == row:
+                del self.openRows[lid]
+        self.__rowChanged(row, 0, 2, STATE_ROLES)
+
+    def __timestampChanged(self, row, old):
+        self.intervals.update(row, old, self.interval(row))
+        self.__validate(row)
+        self.__rowChanged(row, 1, 2, TEXT_ROLES)
+        self.marksChanged.emit()
+
+    def __validate(self, row):
+        # the label or the interval of the mark changed
+        self.validator.update(self.keys[row], self.labelIds[row],
+                              *self.interval(row))
+
+    def __rowChanged(self, row, first, last, roles):
+        self.dataChanged.emit(self.index(row, first), self.index(row, last),
+                              roles)
+
+    def __record(self, *operation):
+        if self.journal is not None:
+            self.journal.record(*operation)
+
+    def validate(self):
+        validity = self.validator.validate()
+        if not validity:
+            return
+        # the rows of the changed keys, in one pass over the keys
+        changed = np.flatnonzero(np.isin(
+            np.array(self.keys, dtype=np.int64),
+            np.fromiter(validity, dtype=np.int64, count=len(validity))))
+        for row in changed.tolist():
+            self.states[row] &= ~FLAG_INVALID
+            if validity[self.keys[row]]:
+                self.states[row] |= FLAG_INVALID
+        # a single notification for the whole range of changed rows
+        if len(changed):
+            self.dataChanged.emit(self.index(int(changed[0]), 0),
+                                  self.index(int(changed[-1]), 0),
+                                  VALIDITY_ROLES)
+
+    def regroup(self):
+        self.validator.regroup()
+        self.validate()
+
+    # only repaint the rows whose state changed since the previous call
+    def highlight(self, ts):
+        active = self.intervals.covering(ts, self.begins, self.ends)
+        for row in active ^ self.highlighted:
+            self.states[row] ^= FLAG_ACTIVE
+            self.__rowChanged(row, 0, 0, STATE_ROLES)
+        self.highlighted = active
@@ -0,0 +1,94 @@
+import struct
+
+import numpy as np
+
+# Layout of a project file, little endian:
+#   header        HEADER, padded to HEADER_SIZE bytes
+#   marks         markCount MARK records, at HEADER_SIZE
+#   vocabulary    stringCount + 1 uint32 offsets into the text that follows,
+#                 then the utf-8 text of the strings
+#   definitions   definitionCount rows of DEFINITION_FIELDS uint32 indexes
+#                 into the vocabulary (id, label, shortcut, group,
+#                 pred incompatibilities), as in the label creator
+# The label of a mark is an index into the vocabulary.
+MAGIC = b'TOFUPROJ'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIQQQ')
+HEADER_SIZE = 64
+MARK = np.dtype([('begin', '<i8'), ('end', '<i8'), ('label', '<u4')])
+DEFINITION_FIELDS = 5
+
+
+class ProjectError(Exception):
+    pass
+
+
+def save_project(path, definitions, labelNames, labelIds, begins, ends):
+    # labelIds index labelNames, which must hold the labels of every mark
+    strings = []
+    index = {}
+
+    def intern(s):
+        if s not in index:
+            index[s] = len(strings)
+            strings.append(s)
+        return index[s]
+
+    # the labels of the marks come first, keeping their ids
+    for name in labelNames:
+        intern(name)
+    table = np.array([[intern(str(field)) for field in
+                       (list(row) + [''] * DEFINITION_FIELDS)
+                       [:DEFINITION_FIELDS]]
+                      for row in definitions], dtype='<u4')
+
+    marks = np.empty(len(begins), dtype=MARK)
+    marks['begin'] = begins
+    marks['end'] = ends
+    marks['label'] = labelIds
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    text = b''.join(encoded)
+
+    vocabularyOffset = HEADER_SIZE + marks.nbytes
+    definitionsOffset = vocabularyOffset + offsets.nbytes + len(text)
+    header = HEADER.pack(MAGIC, VERSION, len(strings), len(table),
+                         DEFINITION_FIELDS, len(marks), vocabularyOffset,
+                         definitionsOffset)
+    with open(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(marks.tobytes())
+        f.write(offsets.tobytes())
+        f.write(text)
+        f.write(table.tobytes())
+
+
+def load_project(path):
+    # (definitions, labelNames, labelIds, begins, ends). The mark columns
+    # are read from a memory map of the file, without parsing.
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(data) < HEADER_SIZE:
+        raise ProjectError("Not a project file: " + path)
+    magic, version, stringCount, definitionCount, fields, markCount, \
+        vocabularyOffset, definitionsOffset = \
+        HEADER.unpack(data[:HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise ProjectError("Not a project file: " + path)
+    if version != VERSION or fields != DEFINITION_FIELDS:
+        raise ProjectError("Unsupported project file version: " + path)
+
+    marks = data[HEADER_SIZE:HEADER_SIZE + markCount * MARK.itemsize] \
+        .view(MARK)
+    textOffset = vocabularyOffset + (stringCount + 1) * 4
+    offsets = data[vocabularyOffset:textOffset].view('<u4')
+    text = data[textOffset:definitionsOffset].tobytes()
+    strings = [text[offsets[i]:offsets[i + 1]].decode('utf-8')
+               for i in range(stringCount)]
+    table = data[definitionsOffset:
+                 definitionsOffset + definitionCount * fields * 4] \
+        .view('<u4').reshape(definitionCount, fields)
+    definitions = [[strings[i] for i in row] for row in table.tolist()]
+    return (definitions, strings, marks['label'], marks['begin'],
+            marks['end'])
@@ -0,0 +1,102 @@
+from PyQt5.QtCore import QObject, QTimer, QElapsedTimer
+
+# a position reported by the player this close (ms) to the target of the
+# last seek means the seek is done
+REACHED = 20
+
+
+class SeekScheduler(QObject):
+    # Seeks of the player go through here. A burst of seeks is coalesced to
+    # its latest target, and at most one seek per interval (ms) reaches the
+    # decoder. Fast seeks (slider drags) go to the previous keyframe, which
+    # is cheap to decode, and are refined to the exact position once no new
+    # seek came for settle ms. The target of the last seek stands for the
+    # position of the player until the player reports it, or for at most
+    # hold ms.
+
+    def __init__(self, player, interval=40, settle=150, hold=500,
+                 parent=None):
+        super(SeekScheduler, self).__init__(parent)
+        self.player = player
+        self.frameIndex = None
+        self.interval = interval
+        self.settle = settle
+        self.hold = hold
+        self.issued = 0
+        self.dropped = 0
+        self.pending = None
+        self.exact = None
+        self.last = None
+        self.target = None
+        self.clock = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        self.settleTimer = QTimer(self)
+        self.settleTimer.setSingleShot(True)
+        self.settleTimer.timeout.connect(self.refine)
+
+    def position(self):
+        # where the player is, or will be once the scheduled seeks are done
+        if self.exact is not None:
+            return self.exact
+        if self.pending is not None:
+            return self.pending
+        if self.target is not None:
+            if self.clock.elapsed() < self.hold:
+                return self.target
+            self.target = None
+        return self.player.position()
+
+    def reached(self, position):
+        # the player reports its position
+        if self.target is not None and \
+                abs(position - self.target) <= REACHED:
+            self.target = None
+
+    def seek(self, position, fast=False):
+        if fast and self.frameIndex is not None:
+            self.exact = position
+            self.settleTimer.start(self.settle)
+            position = self.frameIndex.keyframe(position)
+            if self.pending is None and position == self.last:
+                # the decoder is already on this keyframe
+                self.dropped += 1
+                return
+        else:
+            self.exact = None
+            self.settleTimer.stop()
+
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = position
+        if not self.clock.isValid() or \
+                self.clock.elapsed() >= self.interval:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start(self.interval - self.clock.elapsed())
+
+    def flush(self):
+        self.timer.stop()
+        if self.pending is None:
+            return
+        position = self.pending
+        self.pending = None
+        self.last = position
+        self.target = position
+        self.issued += 1
+        self.clock.start()
+        self.player.setPosition(position)
+
+    def refine(self):
+        if self.exact is not None:
+            self.seek(self.exact)
+
+    def reset(self, frameIndex=None):
+        self.timer.stop()
+        self.settleTimer.stop()
+        self.frameIndex = frameIndex
+        self.pending = None
+        self.exact = None
+        self.last = None
+        self.target = None
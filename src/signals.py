@@ -4,8 +4,9 @@ from PyQt5.QtGui import QKeySequence
 
 class SignalBus(QObject):
     __instance = None
-    newLabelSignal = pyqtSignal(QKeySequence, str)
-    delLabelSignal = pyqtSignal(str)
+    # shortcut and id of a label, see group.LabelGroups.internLabel
+    newLabelSignal = pyqtSignal(QKeySequence, int)
+    delLabelSignal = pyqtSignal(int)
     uptLabelSlicer = pyqtSignal(int, str)
 
     @staticmethod
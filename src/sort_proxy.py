@@ -0,0 +1,292 @@
+import numpy as np
+from PyQt5.QtCore import QAbstractProxyModel, QModelIndex, Qt
+
+from marks_model import NO_END
+from mark_index import MarkIndex
+from tracer import span
+
+# column of the marks model in the order of its rows
+BEGIN_COLUMN = 1
+
+
+class MarksSortProxy(QAbstractProxyModel):
+    # View-side order and filter of the marks of a MarksModel, whose rows
+    # are sorted by begin. Sorting by label (then begin) or by duration (the
+    # end column, then begin) is a permutation computed with numpy, and the
+    # marks of a label, a group, a validity or a time window are selected
+    # from a MarkIndex: the model is never rewritten, and sorting or
+    # filtering 100k marks takes milliseconds. Unfiltered, in the order of
+    # the model, the rows are mapped one to one and the changes of the
+    # model are passed through as they are.
+
+    def __init__(self, groups, parent=None):
+        super(MarksSortProxy, self).__init__(parent)
+        self.groups = groups
+        self.marks = None
+        self.column = BEGIN_COLUMN
+        self.order = Qt.AscendingOrder
+        # filter: None is any label, group, validity or bound
+        self.label = None
+        self.group = None
+        self.invalid = None
+        self.begin = None
+        self.end = None
+        # proxy row -> model row, and back (-1 if filtered out); None in
+        # the order of the model
+        self.rows = None
+        self.positions = None
+        # a row of the model being removed is shown
+        self.removing = False
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super(MarksSortProxy, self).setSourceModel(model)
+        model.rowsAboutToBeInserted.connect(self.onRowsAboutToBeInserted)
+        model.rowsInserted.connect(self.onRowsInserted)
+        model.rowsAboutToBeRemoved.connect(self.onRowsAboutToBeRemoved)
+        model.rowsRemoved.connect(self.onRowsRemoved)
+        model.rowsAboutToBeMoved.connect(self.onRowsAboutToBeMoved)
+        model.rowsMoved.connect(self.onRowsMoved)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self.onModelReset)
+        model.dataChanged.connect(self.onDataChanged)
+        self.marks = MarkIndex(model, self.groups)
+        self.rows, self.positions = self.computeOrder()
+        self.endResetModel()
+
+    def isFiltered(self):
+        return any(f is not None for f in (self.label, self.group,
+                                           self.invalid, self.begin,
+                                           self.end))
+
+    def filterRows(self):
+        # sorted rows of the model shown, None for all of them
+        rows = None
+        if self.label is not None:
+            rows = self.marks.labelRows(self.label)
+        if self.group is not None:
+            groupRows = self.marks.groupRows(self.group)
+            rows = groupRows if rows is None else \
+                np.intersect1d(rows, groupRows, assume_unique=True)
+        if self.begin is not None or self.end is not None:
+            rows = self.marks.window(rows, self.begin, self.end)
+        if self.invalid is not None:
+            rows = self.marks.validity(rows, self.invalid)
+        return rows
+
+    def computeOrder(self):
+        # (rows, positions) of the current filter and order
+        m = self.sourceModel()
+        rows = self.filterRows()
+        if self.column not in (0, 1, 2) or \
+                (self.column == BEGIN_COLUMN and
+                 self.order == Qt.AscendingOrder):
+            if rows is None:
+                return None, None
+        else:
+            begins = np.array(m.begins, dtype=np.int64)
+            if rows is None:
+                rows = np.arange(len(begins))
+            if self.column == 0:
+                names = m.labelNames
+                rank = np.empty(len(names), dtype=np.int64)
+                rank[sorted(range(len(names)), key=names.__getitem__)] = \
+                    np.arange(len(names))
+                ids = np.array(m.labelIds, dtype=np.int64)
+                rows = rows[np.lexsort((begins[rows], rank[ids[rows]]))]
+            elif self.column == 2:
+                ends = np.array(m.ends, dtype=np.int64)[rows]
+                durations = np.where(ends == NO_END, np.iinfo(np.int64).max,
+                                     ends - begins[rows])
+                rows = rows[np.lexsort((begins[rows], durations))]
+            if self.order == Qt.DescendingOrder:
+                rows = rows[::-1]
+        rows = np.ascontiguousarray(rows, dtype=np.int64)
+        positions = np.full(m.rowCount(), -1, dtype=np.int64)
+        positions[rows] = np.arange(len(rows))
+        return rows, positions
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        with span('sort'):
+            self.column = column
+            self.order = order
+            self.resort()
+
+    def setFilter(self, label=None, group=None, invalid=None, begin=None,
+                  end=None):
+        # shows the marks of label, of the labels of group, invalid or
+        # valid ones, overlapping [begin, end] (ms); None for any
+        with span('filter'):
+            self.label = label
+            self.group = group
+            self.invalid = invalid
+            self.begin = begin
+            self.end = end
+            self.resort()
+
+    def regroup(self):
+        # the groups of the labels changed
+        self.marks.regroup()
+        if self.group is not None:
+            self.resort()
+
+    def resort(self):
+        rows, positions = self.computeOrder()
+        if (self.rowCount() if rows is None else len(rows)) != \
+                self.rowCount():
+            # marks were filtered in or out
+            self.beginResetModel()
+            self.rows, self.positions = rows, positions
+            self.endResetModel()
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [self.mapToSource(i) for i in persistent]
+        self.rows, self.positions = rows, positions
+        self.changePersistentIndexList(
+            persistent, [self.mapFromSource(i) for i in sources])
+        self.layoutChanged.emit()
+
+    def mapToSource(self, index):
+        m = self.sourceModel()
+        if not index.isValid() or m is None:
+            return QModelIndex()
+        row = index.row()
+        if self.rows is not None:
+            row = int(self.rows[row])
+        return m.index(row, index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        row = index.row()
+        if self.positions is not None:
+            row = int(self.positions[row])
+        return self.index(row, index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or row >= self.rowCount() or \
+                column < 0 or column >= self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            return super(MarksSortProxy, self).parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        m = self.sourceModel()
+        if parent.isValid() or m is None:
+            return 0
+        return m.rowCount() if self.rows is None else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        m = self.sourceModel()
+        return 0 if parent.isValid() or m is None else m.columnCount()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Vertical:
+            return str(section + 1) if role == Qt.DisplayRole else None
+        return self.sourceModel().headerData(section, orientation, role)
+
+    # The model inserts, removes and moves a single row at a time, and the
+    # index of the marks follows. Unfiltered in the order of the model, the
+    # changes are passed through; otherwise the place of the row is only
+    # known once the model changed, and the order is computed again. The
+    # other marks stay in or out of the filter.
+
+    def onRowsAboutToBeInserted(self, parent, first, last):
+        if self.rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def onRowsInserted(self, parent, first, last):
+        for row in range(first, last + 1):
+            self.marks.insert(row)
+        if self.rows is None:
+            self.endInsertRows()
+            return
+        rows, positions = self.computeOrder()
+        shown = sorted(int(positions[r]) for r in range(first, last + 1)
+                       if positions[r] >= 0)
+        # the rows shown until then, renumbered
+        self.rows = np.where(self.rows >= first,
+                             self.rows + last - first + 1, self.rows)
+        if not shown:
+            self.rows, self.positions = rows, positions
+        elif len(shown) == 1:
+            self.beginInsertRows(QModelIndex(), shown[0], shown[0])
+            self.rows, self.positions = rows, positions
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            self.rows, self.positions = rows, positions
+            self.endResetModel()
+
+    def onRowsAboutToBeRemoved(self, parent, first, last):
+        self.removing = True
+        if self.rows is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+        elif first == last:
+            row = int(self.positions[first])
+            if row >= 0:
+                self.beginRemoveRows(QModelIndex(), row, row)
+            else:
+                self.removing = False
+        else:
+            self.beginResetModel()
+
+    def onRowsRemoved(self, parent, first, last):
+        for row in range(last, first - 1, -1):
+            self.marks.remove(row)
+        rows, positions = self.computeOrder()
+        if not self.removing:
+            self.rows, self.positions = rows, positions
+        elif self.rows is None or first == last:
+            self.rows, self.positions = rows, positions
+            self.endRemoveRows()
+        else:
+            self.rows, self.positions = rows, positions
+            self.endResetModel()
+        self.removing = False
+
+    def onRowsAboutToBeMoved(self, parent, first, last, destination, row):
+        if self.rows is None:
+            self.beginMoveRows(QModelIndex(), first, last, QModelIndex(),
+                               row)
+
+    def onRowsMoved(self, parent, first, last, destination, row):
+        self.marks.move(first, row - 1 if row > first else row)
+        if self.rows is None:
+            self.endMoveRows()
+        else:
+            self.resort()
+
+    def onModelReset(self):
+        self.marks.rebuild()
+        self.rows, self.positions = self.computeOrder()
+        self.endResetModel()
+
+    def onDataChanged(self, topLeft, bottomRight, roles=()):
+        text = not roles or Qt.DisplayRole in roles
+        if text and topLeft.column() == 0:
+            for row in range(topLeft.row(), bottomRight.row() + 1):
+                self.marks.relabel(row)
+        if self.rows is None:
+            self.dataChanged.emit(self.index(topLeft.row(), topLeft.column()),
+                                  self.index(bottomRight.row(),
+                                             bottomRight.column()),
+                                  list(roles))
+            return
+        if text or (self.invalid is not None and
+                    Qt.ForegroundRole in roles):
+            # the label, the timestamps or the validity of a mark changed,
+            # and so may its place in the order or the filter
+            self.resort()
+        rows = self.positions[topLeft.row():bottomRight.row() + 1]
+        rows = rows[rows >= 0]
+        if len(rows):
+            self.dataChanged.emit(
+                self.index(int(rows.min()), topLeft.column()),
+                self.index(int(rows.max()), bottomRight.column()),
+                list(roles))
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+
+# Marks of many videos in a single SQLite database. A video is identified by
+# its path without extension, which is shared by the video and its csv file.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS marks (
+    video INTEGER NOT NULL REFERENCES videos(id),
+    label INTEGER NOT NULL REFERENCES labels(id),
+    begin INTEGER NOT NULL,
+    end INTEGER
+);
+CREATE INDEX IF NOT EXISTS marks_video ON marks(video);
+CREATE INDEX IF NOT EXISTS marks_label_begin ON marks(label, begin);
+CREATE INDEX IF NOT EXISTS marks_begin ON marks(begin);
+"""
+
+
+def video_key(path):
+    return os.path.splitext(os.path.abspath(path))[0]
+
+
+class AnnotationStore:
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.labelIds = dict(self.db.execute("SELECT name, id FROM labels"))
+
+    def close(self):
+        self.db.close()
+
+    def __labelId(self, name):
+        lid = self.labelIds.get(name)
+        if lid is None:
+            lid = self.db.execute("INSERT INTO labels (name) VALUES (?)",
+                                  (name,)).lastrowid
+            self.labelIds[name] = lid
+        return lid
+
+    def __videoId(self, path):
+        self.db.execute("INSERT OR IGNORE INTO videos (path) VALUES (?)",
+                        (video_key(path),))
+        return self.db.execute("SELECT id FROM videos WHERE path = ?",
+                               (video_key(path),)).fetchone()[0]
+
+    def putMarks(self, path, labels, begins, ends):
+        # replaces the marks of a video; ends < 0 are marks without end.
+        # Nothing is committed: see commit(), or use replaceMarks()
+        video = self.__videoId(path)
+        self.db.execute("DELETE FROM marks WHERE video = ?", (video,))
+        self.db.executemany(
+            "INSERT INTO marks (video, label, begin, end) VALUES (?, ?, ?, ?)",
+            ((video, self.__labelId(l), int(b), int(e) if e >= 0 else None)
+             for l, b, e in zip(labels, begins, ends)))
+
+    def commit(self):
+        self.db.commit()
+
+    def replaceMarks(self, path, labels, begins, ends):
+        with self.db:
+            self.putMarks(path, labels, begins, ends)
+
+    def marks(self, path):
+        # (labels, begins, ends) of a video, sorted by begin
+        rows = self.db.execute(
+            "SELECT labels.name, begin, IFNULL(end, -1) FROM marks "
+            "JOIN labels ON labels.id = marks.label "
+            "JOIN videos ON videos.id = marks.video "
+            "WHERE videos.path = ? ORDER BY begin", (video_key(path),))
+        labels, begins, ends = [], [], []
+        for label, begin, end in rows:
+            labels.append(label)
+            begins.append(begin)
+            ends.append(end)
+        return labels, begins, ends
+
+    def query(self, label=None, minDuration=None, begin=None, end=None):
+        # marks (video, label, begin, end) of every video, whose label
+        # matches the glob pattern label, lasting at least minDuration ms
+        # and intersecting [begin, end]
+        where = []
+        args = []
+        if label is not None:
+            where.append("labels.name GLOB ?")
+            args.append(label)
+        if minDuration is not None:
+            where.append("marks.end - marks.begin >= ?")
+            args.append(minDuration)
+        if begin is not None:
+            where.append("IFNULL(marks.end, marks.begin) >= ?")
+            args.append(begin)
+        if end is not None:
+            where.append("marks.begin <= ?")
+            args.append(end)
+        sql = ("SELECT videos.path, labels.name, marks.begin, "
+               "IFNULL(marks.end, -1) FROM labels "
+               "JOIN marks ON marks.label = labels.id "
+               "JOIN videos ON videos.id = marks.video")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY videos.path, marks.begin"
+        return self.db.execute(sql, args)
+
+
+def open_store():
+    # the store is optional: it is used when TOFU_STORE names its file
+    path = os.environ.get('TOFU_STORE')
+    if not path:
+        return None
+    return AnnotationStore(path)
@@ -0,0 +1,121 @@
+import numpy as np
+
+# Timestamps are written "HH:MM:SS,mmm", the format of srt subtitles, and
+# stored as integer milliseconds. Negative values stand for the missing
+# timestamps, written '...' (the end of a mark not closed yet).
+
+MISSING = '...'
+
+# "SS," for every second of a minute, "mmm" for every ms of a second, and
+# "HH:MM:" for the minutes already formatted: formatting a timestamp is then
+# two divisions, three lookups and a concatenation. The positions of the
+# player and the visible cells of the mark table are formatted over and
+# over, always hitting the cache. The tables are small enough to be built
+# at import without slowing down the start.
+SECONDS_TEXT = ["%02d," % s for s in range(60)]
+MILLISECONDS_TEXT = ["%03d" % ms for ms in range(1000)]
+MINUTES_TEXT = {}
+
+# position of the digits and separators in "HH:MM:SS,mmm"
+DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+SEPARATORS = {2: ord(':'), 5: ord(':'), 8: ord(',')}
+WEIGHTS = np.array([36000000, 3600000, 600000, 60000, 10000, 1000,
+                    100, 10, 1], dtype=np.int64)
+
+
+def format_time(msec):
+    minutes, msec = divmod(int(msec), 60000)
+    prefix = MINUTES_TEXT.get(minutes)
+    if prefix is None:
+        prefix = MINUTES_TEXT[minutes] = "%02d:%02d:" % divmod(minutes, 60)
+    seconds, msec = divmod(msec, 1000)
+    return prefix + SECONDS_TEXT[seconds] + MILLISECONDS_TEXT[msec]
+
+
+def str_to_ms(txt):
+    elems = txt.split(",")
+    if len(elems) != 2:
+        return -1
+    ms = int(elems[1])
+    elems2 = elems[0].split(":")
+    if len(elems2) != 3:
+        return -1
+    h = int(elems2[0])
+    m = int(elems2[1])
+    s = int(elems2[2])
+
+    return ms + 1000 * (s + 60 * (m + 60 * h))
+
+
+def parse_times(texts, return_canonical=False):
+    # str_to_ms over a whole column, as an int64 array. Values that can not
+    # be parsed give -1 instead of raising. With return_canonical, also
+    # returns the mask of the texts that format_time writes identically.
+    texts = np.ascontiguousarray(texts, dtype=str)
+    n = len(texts)
+    result = np.full(n, -1, dtype=np.int64)
+    canonical = np.zeros(n, dtype=bool)
+    width = texts.dtype.itemsize // 4
+    if n > 0 and width >= 12:
+        codes = texts.view(np.uint32).reshape(n, width)
+        canonical[:] = True
+        if width > 12:
+            canonical &= codes[:, 12] == 0
+        for column, code in SEPARATORS.items():
+            canonical &= codes[:, column] == code
+        digits = codes[:, DIGITS].astype(np.int64) - ord('0')
+        canonical &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        canonical &= (digits[:, 2] < 6) & (digits[:, 4] < 6)
+        result[canonical] = digits[canonical] @ WEIGHTS
+
+    # the other texts are parsed one by one
+    for i in np.flatnonzero(~canonical):
+        try:
+            result[i] = str_to_ms(str(texts[i]))
+        except ValueError:
+            pass
+
+    if return_canonical:
+        return result, canonical
+    return result
+
+
+def format_times(values):
+    # format_time over a whole column, as a list of str. Negative values
+    # are written '...'.
+    values = np.asarray(values, dtype=np.int64)
+    n = len(values)
+    codes = np.empty((n, 12), dtype=np.uint32)
+    for column, code in SEPARATORS.items():
+        codes[:, column] = code
+    rest = values.copy()
+    for column, weight in zip(DIGITS, WEIGHTS):
+        codes[:, column] = rest // weight
+        rest -= codes[:, column].astype(np.int64) * weight
+    codes[:, DIGITS] += ord('0')
+    result = codes.view('U12').ravel().tolist()
+
+    # more than 99 hours, or missing
+    for i in np.flatnonzero((values < 0) | (values >= 100 * 3600000)):
+        result[i] = MISSING if values[i] < 0 else format_time(values[i])
+    return result
+
+
+def marks_from_rows(rows):
+    # rows of a mark file (label, begin, end) to columns: labels, and
+    # begins and ends in ms. Rows without a valid begin are dropped.
+    rows = [row for row in rows if len(row) >= 3]
+    labels = [row[0] for row in rows]
+    begins = parse_times([row[1] for row in rows])
+    ends = parse_times([row[2] for row in rows])
+    valid = begins >= 0
+    if not valid.all():
+        labels = [l for l, v in zip(labels, valid) if v]
+        begins = begins[valid]
+        ends = ends[valid]
+    return labels, begins, np.where(ends < 0, -1, ends)
+
+
+def rows_from_marks(labels, begins, ends):
+    return [list(row) for row in zip(labels, format_times(begins),
+                                     format_times(ends))]
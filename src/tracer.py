@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QLabel
+
+# Timing of the hot paths. Spans are only recorded while the tracer is
+# enabled, by TOFU_TRACE (naming the file the trace is written to) or from
+# the menu: otherwise a span costs the test of a flag.
+MAX_EVENTS = 500000
+# durations kept per hook for the percentiles
+RECENT = 1000
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class NoSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+class Tracer:
+    __instance = None
+
+    @staticmethod
+    def instance():
+        if not Tracer.__instance:
+            Tracer.__instance = Tracer()
+        return Tracer.__instance
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.origin = time.perf_counter_ns()
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.recent = {}
+        self.counts = {}
+
+    def start(self, path):
+        self.path = path
+        self.events.clear()
+        self.recent = {}
+        self.counts = {}
+        self.enabled = True
+
+    def stop(self):
+        # writes the trace, returns its path
+        self.enabled = False
+        if self.path is None:
+            return None
+        self.write(self.path)
+        return self.path
+
+    def span(self, name):
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    def add(self, name, start, stop):
+        self.events.append((name, start, stop - start, threading.get_ident()))
+        if name not in self.recent:
+            self.recent[name] = deque(maxlen=RECENT)
+            self.counts[name] = 0
+        self.recent[name].append(stop - start)
+        self.counts[name] += 1
+
+    def stats(self):
+        # (hook, calls, p50 ms, p99 ms) over the last RECENT calls
+        result = []
+        for name in sorted(self.recent):
+            p50, p99 = np.percentile(np.array(self.recent[name]), [50, 99])
+            result.append((name, self.counts[name], p50 / 1e6, p99 / 1e6))
+        return result
+
+    def write(self, path):
+        # Chrome trace event format, as read by chrome://tracing or Perfetto
+        pid = os.getpid()
+        spans = list(self.events)
+        # the startup span begins before the tracer is created
+        origin = min([self.origin] + [start for _, start, _, _ in spans])
+        events = [{'name': name, 'cat': 'tofu', 'ph': 'X', 'pid': pid,
+                   'tid': tid, 'ts': (start - origin) / 1000,
+                   'dur': duration / 1000}
+                  for name, start, duration, tid in spans]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, mode='w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      trace_file)
+
+
+def span(name):
+    return Tracer.instance().span(name)
+
+
+def trace_path():
+    # the tracer is enabled at start when TOFU_TRACE names its file
+    return os.environ.get('TOFU_TRACE') or None
+
+
+class StatsOverlay(QLabel):
+    # p50/p99 of the hooks, drawn over the top left corner of its parent
+
+    def __init__(self, tracer, parent):
+        super(StatsOverlay, self).__init__(parent)
+        self.tracer = tracer
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QFont('monospace', 8))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 160);"
+                           "color: white; padding: 4px;")
+        # (name, function) of the counters shown under the hooks
+        self.counters = []
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def addCounter(self, name, counter):
+        self.counters.append((name, counter))
+
+    def start(self):
+        self.refresh()
+        self.show()
+        self.raise_()
+        self.timer.start(500)
+
+    def stop(self):
+        self.timer.stop()
+        self.hide()
+
+    def refresh(self):
+        lines = ["%-24s %7s %9s %9s" % ("hook", "calls", "p50 ms", "p99 ms")]
+        for name, count, p50, p99 in self.tracer.stats():
+            lines.append("%-24s %7d %9.2f %9.2f" % (name, count, p50, p99))
+        for name, counter in self.counters:
+            lines.append("%-24s %7d" % (name, counter()))
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(8, 8)
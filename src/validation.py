@@ -0,0 +1,323 @@
+from bisect import bisect_left, bisect_right, insort
+
+from interval_index import OPEN_END
+
+# above any key, for the searches by begin
+LAST = float('inf')
+
+
+def find_invalid(marks, groups, covering=True):
+    # marks: (key, label id, begin, end) of the marks of a single group.
+    # A mark is invalid if it intersects another mark of the group, or if
+    # its predecessor in the group is in its list of incompatible labels.
+    # One sweep over the marks sorted by begin answers both questions.
+    # Empty marks (begin == end) intersect the marks that contain them
+    # (bounds included), but not each other. A mark ending before it begins
+    # is taken as an empty one. If not covering, an open mark does not
+    # intersect the marks beginning after it.
+    marks = sorted(((key, label, begin, max(begin, end))
+                    for key, label, begin, end in marks),
+                   key=lambda m: (m[2], m[0]))
+    points = [m[2] for m in marks if m[2] == m[3]]
+    spans = [m for m in marks if m[2] != m[3]]
+    spanBegins = [m[2] for m in spans]
+    spanMaxEnds = []
+    maxEnd = float('-inf')
+    for m in spans:
+        if covering or m[3] != OPEN_END:
+            maxEnd = max(maxEnd, m[3])
+        spanMaxEnds.append(maxEnd)
+
+    intersecting = set()
+    for i, (key, label, begin, end) in enumerate(spans):
+        if (i > 0 and spanMaxEnds[i - 1] > begin) or \
+                (i + 1 < len(spans) and spanBegins[i + 1] < end):
+            intersecting.add(key)
+        else:
+            p = bisect_left(points, begin)
+            if p < len(points) and points[p] <= end:
+                intersecting.add(key)
+    for key, label, begin, end in marks:
+        if begin == end:
+            s = bisect_right(spanBegins, begin)
+            if s > 0 and spanMaxEnds[s - 1] >= begin:
+                intersecting.add(key)
+
+    invalid = set(intersecting)
+    runStart = 0
+    predRunStart = -1
+    for i, (key, label, begin, end) in enumerate(marks):
+        if i > 0 and marks[i - 1][2] != begin:
+            predRunStart = runStart
+            runStart = i
+        if key not in intersecting and predRunStart != -1 and \
+                groups.isIncompPredId(label, marks[predRunStart][1]):
+            invalid.add(key)
+    return invalid
+
+
+class GroupMarks:
+    # The marks of a group sorted by (begin, key), the lengths of the closed
+    # ones (sorted, for the longest) and the open ones apart.
+
+    def __init__(self, marks=()):
+        # marks: (key, begin, end)
+        self.order = sorted((begin, key) for key, begin, end in marks)
+        self.lengths = sorted(end - begin for key, begin, end in marks
+                              if end != OPEN_END)
+        self.opened = sorted((begin, key) for key, begin, end in marks
+                             if end == OPEN_END)
+
+    def add(self, key, begin, end):
+        insort(self.order, (begin, key))
+        if end == OPEN_END:
+            insort(self.opened, (begin, key))
+        else:
+            insort(self.lengths, end - begin)
+
+    def discard(self, key, begin, end):
+        del self.order[bisect_left(self.order, (begin, key))]
+        if end == OPEN_END:
+            del self.opened[bisect_left(self.opened, (begin, key))]
+        else:
+            del self.lengths[bisect_left(self.lengths, end - begin)]
+
+    def maxLen(self):
+        return self.lengths[-1] if self.lengths else 0
+
+    def first(self, begin):
+        # index in order of the first mark beginning at or after begin
+        return bisect_left(self.order, (begin, -1))
+
+    def after(self, begin):
+        # index in order of the first mark beginning after begin
+        return bisect_right(self.order, (begin, LAST))
+
+
+class GroupValidator:
+    # Incremental validity of the marks, group by group. Keys are stable
+    # ids of the marks, which do not change when other marks are inserted,
+    # removed or moved. A change of a mark only revalidates the marks it can
+    # affect: the marks overlapping its old and new interval, and the marks
+    # following it in its group, whose predecessor it may be. They are found
+    # by binary search on the marks of the group sorted by begin, looking
+    # back at most as far as the longest closed mark of the group.
+    # An open mark intersects every mark beginning after it: this is kept
+    # apart, as the first begin of an open mark of the group, so that
+    # opening or closing a mark only flips the marks between the old and the
+    # new first begin, without revalidating them.
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.clear()
+
+    def clear(self):
+        # key -> (label id, begin, end)
+        self.marks = {}
+        self.members = {}
+        # keys of the marks invalid whatever the open marks before them
+        self.invalid = set()
+        # key -> validity, of the marks whose validity changed since the
+        # last call to validate()
+        self.changed = {}
+
+    def __group(self, lid):
+        # index of the group of the label, -1 if none
+        return self.groups.getGroupId(lid)
+
+    def __members(self, key):
+        return self.members.get(self.__group(self.marks[key][0]))
+
+    def isInvalid(self, key):
+        if key in self.invalid:
+            return True
+        members = self.__members(key)
+        return members is not None and self.__covered(members, key)
+
+    def rebuild(self, marks):
+        # marks: iterable of (key, label id, begin, end). Everything is
+        # validated again, in one sweep per group.
+        self.clear()
+        groupOf = {}
+        grouped = {}
+        for key, lid, begin, end in marks:
+            self.marks[key] = (lid, begin, max(begin, end))
+            if lid not in groupOf:
+                groupOf[lid] = self.__group(lid)
+            if groupOf[lid] >= 0:
+                grouped.setdefault(groupOf[lid], []).append(key)
+        for group, keys in grouped.items():
+            members = GroupMarks([(key,) + self.marks[key][1:]
+                                  for key in keys])
+            self.members[group] = members
+            self.invalid |= find_invalid(
+                [(key,) + self.marks[key] for _, key in members.order],
+                self.groups, covering=False)
+        self.changed = dict.fromkeys(self.__shown(), True)
+
+    def __shown(self):
+        # keys of all the invalid marks
+        shown = set(self.invalid)
+        for members in self.members.values():
+            if members.opened:
+                begin, first = members.opened[0]
+                shown.update(key for _, key in
+                             members.order[members.first(begin):])
+                if first not in self.invalid and \
+                        not self.__covered(members, first):
+                    shown.discard(first)
+        return shown
+
+    def regroup(self):
+        # the label definitions changed
+        before = self.__shown()
+        changed = self.changed
+        self.rebuild([(key,) + mark for key, mark in self.marks.items()])
+        after = self.__shown()
+        changed.update((key, key in after) for key in before ^ after)
+        self.changed = changed
+
+    def insert(self, key, lid, begin, end):
+        self.marks[key] = (lid, begin, max(begin, end))
+        self.__revalidate(self.__add(key))
+
+    def remove(self, key):
+        affected = self.__discard(key)
+        del self.marks[key]
+        affected.discard(key)
+        self.invalid.discard(key)
+        self.changed.pop(key, None)
+        self.__revalidate(affected)
+
+    def update(self, key, lid, begin, end):
+        # the label or the interval of the mark changed
+        affected = self.__discard(key)
+        self.marks[key] = (lid, begin, max(begin, end))
+        affected |= self.__add(key)
+        if self.__group(lid) < 0:
+            self.invalid.discard(key)
+            self.changed[key] = False
+        self.__revalidate(affected)
+
+    def __add(self, key):
+        # adds the mark to its group, returns the keys it affects there
+        lid, begin, end = self.marks[key]
+        group = self.__group(lid)
+        if group < 0:
+            return set()
+        members = self.members.setdefault(group, GroupMarks())
+        first = self.__firstOpen(members)
+        members.add(key, begin, end)
+        return self.__affected(members, key) | self.__cover(members, first)
+
+    def __discard(self, key):
+        # removes the mark from its group, returns the keys it affected
+        lid, begin, end = self.marks[key]
+        group = self.__group(lid)
+        if group < 0:
+            return set()
+        members = self.members[group]
+        affected = self.__affected(members, key)
+        first = self.__firstOpen(members)
+        members.discard(key, begin, end)
+        return affected | self.__cover(members, first)
+
+    @staticmethod
+    def __firstOpen(members):
+        return members.opened[0][0] if members.opened else LAST
+
+    def __covered(self, members, key):
+        # the mark begins after an open mark, other than itself
+        for b, k in members.opened[:2]:
+            if k != key:
+                return b <= self.marks[key][1]
+        return False
+
+    def __cover(self, members, first):
+        # the first begin of an open mark was first: the marks between it
+        # and the new one are now covered by an open mark, or no longer.
+        # Returns the open marks, to be revalidated.
+        now = self.__firstOpen(members)
+        if now != first:
+            covered = now < first
+            lo, hi = min(now, first), max(now, first)
+            self.changed.update(
+                (k, covered) for _, k in
+                members.order[members.first(lo):members.first(hi)]
+                if k not in self.invalid)
+        return {k for _, k in members.opened}
+
+    def __affected(self, members, key):
+        # the mark, the marks of its group overlapping it (bounds included),
+        # and the ones of the next begin, which have it as predecessor. An
+        # open mark is only looked at where it begins: the marks after it
+        # are covered by it.
+        lid, begin, end = self.marks[key]
+        if end == OPEN_END:
+            end = begin
+        order = members.order
+        lo = begin - members.maxLen()
+        affected = {k for b, k in order[members.first(lo):members.after(end)]
+                    if self.marks[k][2] >= begin}
+        i = members.after(begin)
+        if i < len(order):
+            affected.update(k for b, k in
+                            order[i:members.after(order[i][0])])
+        affected.add(key)
+        return affected
+
+    def __intersects(self, members, key):
+        # as find_invalid, not covering: closed intervals overlapping, but
+        # two empty marks do not intersect each other, and the open marks
+        # before the mark are left to __covered
+        lid, begin, end = self.marks[key]
+        order = members.order
+        lo = members.first(begin - members.maxLen())
+        if begin == end:
+            for b, k in order[lo:members.after(begin)]:
+                e = self.marks[k][2]
+                if b != e and begin <= e != OPEN_END:
+                    return True
+            return False
+        # another mark beginning in [begin, end), or an empty one at end
+        i = members.first(begin)
+        for b, k in order[i:i + 2]:
+            if k != key and b < end:
+                return True
+        if end != OPEN_END:
+            for b, k in order[members.first(end):members.after(end)]:
+                if self.marks[k][2] == b:
+                    return True
+        # a closed mark beginning before and ending after begin
+        return any(begin < self.marks[k][2] != OPEN_END
+                   for b, k in order[lo:i])
+
+    def __incompatible(self, members, key):
+        # the label of the first mark of the previous begin in the group is
+        # incompatible with the one of the mark
+        order = members.order
+        i = members.first(self.marks[key][1])
+        if i == 0:
+            return False
+        pred = self.marks[order[members.first(order[i - 1][0])][1]][0]
+        return self.groups.isIncompPredId(self.marks[key][0], pred)
+
+    def __revalidate(self, keys):
+        for key in keys:
+            members = self.__members(key)
+            if members is None:
+                continue
+            if self.__intersects(members, key) or \
+                    self.__incompatible(members, key):
+                self.invalid.add(key)
+                self.changed[key] = True
+            else:
+                self.invalid.discard(key)
+                self.changed[key] = self.__covered(members, key)
+
+    def validate(self):
+        # key -> validity, of the marks whose validity may have changed
+        # since the last call
+        changed = self.changed
+        self.changed = {}
+        return changed
@@ -0,0 +1,51 @@
+import csv
+import os
+
+MEDIA_EXTENSIONS = ('.mp4', '.avi', '.ogv')
+
+
+class VideoQueue:
+    # Videos to label one after the other
+
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.position = 0
+
+    @staticmethod
+    def fromDirectory(directory):
+        # the videos of the directory and its subdirectories, sorted by path
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            paths += [os.path.join(root, f) for f in sorted(files)
+                      if f.lower().endswith(MEDIA_EXTENSIONS)]
+        return VideoQueue(paths)
+
+    @staticmethod
+    def fromManifest(manifest):
+        # one video per line, in the first column of a csv file; relative
+        # paths start from the directory of the manifest. Empty lines and
+        # lines starting with '#' are skipped.
+        base = os.path.dirname(os.path.abspath(manifest))
+        paths = []
+        with open(manifest, mode='r', newline='') as manifest_file:
+            for row in csv.reader(manifest_file):
+                if not row or not row[0].strip() or row[0].startswith('#'):
+                    continue
+                paths.append(os.path.join(base, row[0].strip()))
+        return VideoQueue(paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def current(self):
+        return self.paths[self.position]
+
+    def next(self):
+        if self.position + 1 < len(self.paths):
+            return self.paths[self.position + 1]
+        return None
+
+    def advance(self):
+        self.position += 1
+        return self.current()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from clip_export import plan_clips
+from frame_index import FrameIndex
+
+MARKS = [['walk', '00:00:01,000', '00:00:02,000'],
+         ['run', '00:00:03,000', '00:00:04,000'],
+         ['walk', '00:00:01,000', '00:00:02,000']]
+
+
+def names(marks, video='video.mp4', frameIndex=None):
+    return [os.path.basename(c.path)
+            for c in plan_clips(video, marks, 'clips', frameIndex)]
+
+
+def test_names_do_not_depend_on_the_other_marks():
+    assert names(MARKS) == ['video_walk_1000-2000.mp4',
+                            'video_run_3000-4000.mp4',
+                            'video_walk_1000-2000_2.mp4']
+    assert names(MARKS[1:2]) == ['video_run_3000-4000.mp4']
+
+
+def test_open_marks_have_no_clip():
+    assert names([['walk', '00:00:01,000', '...']]) == []
+
+
+def test_encoded_clips_of_other_containers_are_mp4():
+    # the clip at 1 s begins on a keyframe and is copied, the other one is
+    # re-encoded
+    index = FrameIndex(range(0, 5000, 40), [0, 1000])
+    assert names(MARKS[:2], 'video.ogv', index) == [
+        'video_walk_1000-2000.ogv', 'video_run_3000-4000.mp4']
+    assert names(MARKS[:1], 'video.avi') == ['video_walk_1000-2000.mp4']
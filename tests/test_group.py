@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from group import LabelGroups, parse_labels
+
+
+def groups(labels):
+    g = LabelGroups()
+    g.addLabels(labels)
+    return g
+
+
+def test_parse_labels():
+    assert parse_labels("Bras gauche, Tête") == ["Bras gauche", "Tête"]
+    assert parse_labels("sit;  walk ,") == ["sit", "walk"]
+    assert parse_labels("sit walk") == ["sit", "walk"]
+    assert parse_labels("Bras gauche", {"Bras gauche"}) == ["Bras gauche"]
+    assert parse_labels("") == []
+
+
+def test_multi_word_labels_are_not_split():
+    g = groups([("Bras gauche", "bras", ""), ("Bras", "bras", ""),
+                ("gauche", "bras", ""),
+                ("Bras droit", "bras", "Bras gauche, Tête")])
+    assert g.isIncompPred("Bras droit", "Bras gauche")
+    assert not g.isIncompPred("Bras droit", "Bras")
+    assert not g.isIncompPred("Bras droit", "gauche")
+
+
+def test_prefixes_do_not_match():
+    g = groups([("sit", "legs", ""), ("sitting", "legs", ""),
+                ("walk", "legs", "sitting")])
+    assert g.isIncompPred("walk", "sitting")
+    assert not g.isIncompPred("walk", "sit")
+    assert not g.isIncompPred("sit", "walk")
+    assert not g.isIncompPred("unknown", "sit")
+
+
+def test_group_ids():
+    g = groups([("sit", "legs", ""), ("wave", "arms", ""),
+                ("nod", "", "")])
+    assert g.getGroupNames() == ["arms", "legs"]
+    assert g.getGroupId(g.labelIdx["sit"]) == 1
+    assert g.getGroupId(g.labelIdx["wave"]) == 0
+    assert g.getGroupId(g.labelIdx["nod"]) == -1
+    assert g.getGroupId(g.internLabel("unknown")) == -1
+    g.addLabel("unknown", "arms", "")
+    assert g.getGroupId(g.labelIdx["unknown"]) == 0
@@ -0,0 +1,64 @@
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from journal import Journal, replay
+
+
+def marks(tmp_path, rows):
+    csvPath = str(tmp_path / 'video.csv')
+    with open(csvPath, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    return str(tmp_path / 'video.journal'), csvPath
+
+
+def test_clean_close_recovers_nothing(tmp_path):
+    path, csvPath = marks(tmp_path, [['walk', '00:00:01,000',
+                                      '00:00:02,000']])
+    journal = Journal(path, csvPath)
+    journal.recordBase()
+    journal.record('end', 0, 3000)
+    journal.compact([['walk', '00:00:01,000', '00:00:03,000']])
+    journal.close()
+    (labels, begins, ends), recovered = replay(path, csvPath)
+    assert recovered == 0
+    assert (labels, begins, ends) == (['walk'], [1000], [3000])
+
+
+def test_edits_are_recovered(tmp_path):
+    path, csvPath = marks(tmp_path, [['walk', '00:00:01,000',
+                                      '00:00:02,000']])
+    journal = Journal(path, csvPath)
+    journal.recordBase()
+    journal.record('insert', 1, 'run', 1500, -1)
+    journal.record('label', 0, 'sit')
+    journal.close()
+    (labels, begins, ends), recovered = replay(path, csvPath)
+    assert recovered == 2
+    assert (labels, begins, ends) == (['sit', 'run'], [1000, 1500],
+                                      [2000, -1])
+
+
+def test_compaction_cut_before_the_journal_is_reset(tmp_path):
+    path, csvPath = marks(tmp_path, [['walk', '00:00:01,000',
+                                      '00:00:02,000']])
+    journal = Journal(path, csvPath)
+    journal.recordBase()
+    journal.record('insert', 0, 'run', 500, 800)
+    journal.close()
+    # the csv was rewritten with the edit, the journal was not reset
+    marks(tmp_path, [['run', '00:00:00,500', '00:00:00,800'],
+                     ['walk', '00:00:01,000', '00:00:02,000']])
+    (labels, begins, ends), recovered = replay(path, csvPath)
+    assert recovered == 0
+    assert (labels, begins, ends) == (['run', 'walk'], [500, 1000],
+                                      [800, 2000])
+    # the edits after a base of the current csv are replayed
+    journal = Journal(path, csvPath)
+    journal.recordBase()
+    journal.record('delete', 1)
+    journal.close()
+    (labels, begins, ends), recovered = replay(path, csvPath)
+    assert recovered == 1
+    assert (labels, begins, ends) == (['run'], [500], [800])
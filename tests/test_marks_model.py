@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from PyQt5.QtCore import QCoreApplication, QModelIndex, Qt
+from group import LabelGroups
+from marks_model import MarksModel, NO_END
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_flags_of_an_invalid_index():
+    model = MarksModel(LabelGroups())
+    model.insertMark("walk", 1000, 2000)
+    model.insertMark("run", 500, NO_END)
+    assert model.flags(QModelIndex()) == Qt.NoItemFlags
+    assert model.flags(model.index(0, 1)) & Qt.ItemIsEditable
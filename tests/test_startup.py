@@ -0,0 +1,15 @@
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'utils'))
+from benchmark import STARTUP_TARGET, startup_time
+
+RUNS = 3
+
+
+def test_cold_start_is_below_target():
+    # time to first window of main.py, as benchmark.py --startup
+    median = statistics.median(startup_time() for i in range(RUNS)) * 1000
+    assert median < STARTUP_TARGET, \
+        "start in %.0f ms, above the %d ms target" % (median, STARTUP_TARGET)
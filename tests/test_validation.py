@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from group import LabelGroups
+from interval_index import OPEN_END
+from validation import GroupValidator, find_invalid
+
+
+def groups():
+    g = LabelGroups()
+    g.addLabels([("sit", "legs", ""), ("walk", "legs", "sit"),
+                 ("run", "legs", "walk"), ("wave", "arms", ""),
+                 ("nod", "", "")])
+    return g
+
+
+def expected(g, marks):
+    # the invalid keys, from a full sweep of each group
+    grouped = {}
+    for key, (lid, begin, end) in marks.items():
+        group = g.getGroupName(g.labelNames[lid])
+        if group != "":
+            grouped.setdefault(group, []).append((key, lid, begin, end))
+    return set().union(*(find_invalid(m, g) for m in grouped.values()))
+
+
+def random_mark(g, rng):
+    lid = g.internLabel(rng.choice(["sit", "walk", "run", "wave", "nod"]))
+    begin = rng.randrange(0, 2000)
+    end = rng.choice([begin, begin + rng.randrange(1, 200),
+                      begin - 10, OPEN_END])
+    return lid, begin, end
+
+
+def test_incremental_validity_matches_a_full_sweep():
+    g = groups()
+    rng = random.Random(4)
+    v = GroupValidator(g)
+    marks = {key: random_mark(g, rng) for key in range(50)}
+    v.rebuild((key,) + mark for key, mark in marks.items())
+    shown = {key for key, invalid in v.validate().items() if invalid}
+    nextKey = len(marks)
+    for step in range(2000):
+        op = rng.random()
+        if op < 0.3 or not marks:
+            marks[nextKey] = random_mark(g, rng)
+            v.insert(nextKey, *marks[nextKey])
+            nextKey += 1
+        elif op < 0.5:
+            key = rng.choice(list(marks))
+            del marks[key]
+            v.remove(key)
+            shown.discard(key)
+        else:
+            key = rng.choice(list(marks))
+            marks[key] = random_mark(g, rng)
+            v.update(key, *marks[key])
+        for key, invalid in v.validate().items():
+            if invalid:
+                shown.add(key)
+            else:
+                shown.discard(key)
+        assert shown == expected(g, marks), step
+        assert all(v.isInvalid(key) == (key in shown) for key in marks)
+
+
+def test_open_mark_intersects_the_marks_after_it():
+    g = groups()
+    sit, run = g.internLabel("sit"), g.internLabel("run")
+    v = GroupValidator(g)
+    v.rebuild([(0, sit, 0, 100), (1, sit, 200, OPEN_END)])
+    assert v.validate() == {}
+    v.insert(2, run, 5000, 5100)
+    assert v.validate() == {1: True, 2: True}
+    v.update(1, sit, 200, 300)
+    assert v.validate() == {1: False, 2: False}
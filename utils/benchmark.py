@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import os
+import csv
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+
+# the widgets are created without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+from PyQt5.QtWidgets import QApplication
+
+from timecodec import format_time, str_to_ms
+from label_creator import LabelCreatorWidget
+from label_editor import LabelEditorWidget
+import tags2srt
+
+SIZES = [1000, 10000, 100000]
+REPEAT = 5
+# the cold start of main.py, to its first window, must stay below (ms)
+STARTUP_TARGET = 500
+# labels of the synthetic sessions: (label, group, pred incompatibilities)
+LABELS = [("walk", "legs", ""), ("run", "legs", "sit"), ("sit", "legs", ""),
+          ("wave", "arms", ""), ("point", "arms", "wave"), ("talk", "", ""),
+          ("look", "", ""), ("nod", "head", "")]
+
+
+def usage():
+    print("benchmark.py [-s|--sizes N,...] [-r|--repeat N] [-o|--output FILE] [-c|--compare FILE] [--startup] [--max-startup MS]|-h|--help")
+    print("Times the hot paths of tofu on synthetic sessions, without display.")
+    print("")
+    print("Parameters:")
+    print("  -h, --help      Display this message and exit")
+    print("  -s, --sizes N,...")
+    print("                  Numbers of marks of the sessions (default: %s)."
+          % ",".join(map(str, SIZES)))
+    print("  -r, --repeat N  Runs of each benchmark; the best and median times are")
+    print("                  kept (default: %d)." % REPEAT)
+    print("  -o, --output FILE")
+    print("                  Write the results to FILE, as json.")
+    print("  -c, --compare FILE")
+    print("                  Print the ratio of each time to the one in FILE, written")
+    print("                  by a previous run.")
+    print("  --startup       Also time the start of main.py, to its first window.")
+    print("  --max-startup MS")
+    print("                  Time the start of main.py, and exit with an error if its")
+    print("                  median is above MS (the target is %d ms)."
+          % STARTUP_TARGET)
+
+
+def synthetic_marks(n, seed=0):
+    # n marks of about 1.5 s every 2 s on average, 1% of them not closed,
+    # as rows of a csv file in a random order
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        begin = rng.randrange(0, 2000 * n)
+        end = begin + rng.randrange(0, 3000)
+        label = LABELS[rng.randrange(len(LABELS))][0]
+        rows.append([label, format_time(begin),
+                     '...' if rng.random() < 0.01 else format_time(end)])
+    return rows
+
+
+class Control:
+    # stands for the player of the video window
+    def setPosition(self, position):
+        pass
+
+
+class Session:
+
+    def __init__(self, n):
+        self.n = n
+        self.rows = synthetic_marks(n)
+        self.creator = LabelCreatorWidget()
+        self.creator.hide()
+        self.creator.groups.addLabels(LABELS)
+        self.editor = LabelEditorWidget(Control(), self.creator.groups)
+
+    def loaded(self):
+        self.editor.set_marks(self.rows)
+        self.editor.onSortItems()
+        return self.editor
+
+
+def timed(function, setup=None, repeat=REPEAT):
+    times = []
+    for i in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def benchmarks(session):
+    n = session.n
+    rows = session.rows
+    texts = [row[1] for row in rows]
+    values = [str_to_ms(t) for t in texts]
+    csvFile = tempfile.NamedTemporaryFile('w', suffix='.csv', newline='',
+                                          delete=False)
+    with csvFile:
+        csv.writer(csvFile).writerows(sorted(rows, key=lambda r: r[1]))
+    ticks = range(0, 2000 * n, max(1, 2000 * n // 1000))
+    walk = session.creator.groups.internLabel("walk")
+    # begins then ends of 50 marks spread over the session
+    marks = [t + d for t in range(0, 2000 * n, 2000 * n // 50)
+             for d in (0, 1000)]
+
+    def edit_one(editor):
+        # one user edit of a begin: the validator follows the edited mark,
+        # then the marks whose validity changed are repainted
+        editor.model.setBegin(n // 2, editor.model.begins[n // 2] + 1)
+        editor.update_incompatibilities()
+
+    yield "str_to_ms", None, lambda _: [str_to_ms(t) for t in texts]
+    yield "format_time", None, lambda _: [format_time(v) for v in values]
+    yield "set_marks", None, lambda _: session.editor.set_marks(rows)
+    yield "sort by label (view)", session.loaded, \
+        lambda editor: editor.proxy.sort(0)
+    yield "sort by duration (view)", session.loaded, \
+        lambda editor: editor.proxy.sort(2)
+    yield "filter by group (view)", session.loaded, \
+        lambda editor: editor.proxy.setFilter(group="legs")
+    yield "filter by time window (view)", session.loaded, \
+        lambda editor: editor.proxy.setFilter(begin=1000 * n,
+                                              end=1100 * n)
+    yield "new_mark (100 marks)", session.loaded, \
+        lambda editor: [editor.new_mark(t, walk) for t in marks]
+    yield "edit begin + update_incompatibilities", session.loaded, edit_one
+    yield "highight_intersecting_items (1000 ticks)", session.loaded, \
+        lambda editor: [editor.highight_intersecting_items(t) for t in ticks]
+    yield "get_marks", session.loaded, lambda editor: editor.get_marks()
+    yield "tags2srt.build_subtitles", None, \
+        lambda _: tags2srt.build_subtitles(csvFile.name, verbose=False)
+    os.unlink(csvFile.name)
+
+
+def startup_time():
+    # time to first window (s) of a new process, as printed by main.py
+    env = dict(os.environ, TOFU_STARTUP_EXIT='1')
+    process = subprocess.run([sys.executable, 'main.py'], cwd=SRC, env=env,
+                             capture_output=True, text=True, timeout=60)
+    for line in process.stdout.splitlines():
+        if line.startswith("startup "):
+            return float(line.split()[1]) / 1000
+    raise RuntimeError("main.py did not start: " + process.stderr.strip())
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat, startup=False):
+    results = []
+    if startup:
+        name = "startup (time to first window)"
+        times = [startup_time() for i in range(repeat)]
+        best, median = min(times), statistics.median(times)
+        results.append({'name': name, 'marks': 0, 'best': best,
+                        'median': median, 'repeat': repeat})
+        print("%-45s %13s %10.4f s (median %.4f s)"
+              % (name, "", best, median), flush=True)
+    for n in sizes:
+        session = Session(n)
+        for name, setup, function in benchmarks(session):
+            best, median = timed(function, setup, repeat)
+            results.append({'name': name, 'marks': n, 'best': best,
+                            'median': median, 'repeat': repeat})
+            print("%-45s %7d marks %10.4f s (median %.4f s)"
+                  % (name, n, best, median), flush=True)
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report, previousFile):
+    with open(previousFile) as f:
+        previous = {(r['name'], r['marks']): r['best']
+                    for r in json.load(f)['results']}
+    print("")
+    print("Compared to %s:" % previousFile)
+    for r in report['results']:
+        before = previous.get((r['name'], r['marks']))
+        if before:
+            print("%-45s %7d marks %8.2fx" % (r['name'], r['marks'],
+                                              r['best'] / before))
+
+
+def main(argv):
+    sizes = SIZES
+    repeat = REPEAT
+    output = None
+    previous = None
+    startup = False
+    maxStartup = None
+    args = iter(argv)
+    try:
+        for arg in args:
+            if arg in ["-h", "--help"]:
+                usage()
+                return 0
+            elif arg in ["-s", "--sizes"]:
+                sizes = [int(s) for s in next(args).split(",") if s]
+            elif arg in ["-r", "--repeat"]:
+                repeat = int(next(args))
+            elif arg in ["-o", "--output"]:
+                output = next(args)
+            elif arg in ["-c", "--compare"]:
+                previous = next(args)
+            elif arg == "--startup":
+                startup = True
+            elif arg == "--max-startup":
+                startup = True
+                maxStartup = float(next(args))
+            else:
+                raise ValueError(arg)
+    except (StopIteration, ValueError):
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+
+    app = QApplication(sys.argv[:1])
+    try:
+        report = run(sizes, repeat, startup)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print("Error:", e)
+        return 1
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if previous is not None:
+        compare(report, previous)
+    if maxStartup is not None:
+        median = report['results'][0]['median'] * 1000
+        if median > maxStartup:
+            print("")
+            print("Error: start in %.0f ms, above the %.0f ms target"
+                  % (median, maxStartup))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import os
+import csv
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+from clip_export import export_clips, MANIFEST
+from frame_index import index_video, INDEX_ERRORS
+
+
+def usage():
+    print("export_clips.py [OPTIONS] VIDEO CSV OUTPUT_DIR|-h|--help")
+    print("A tool to cut each mark of a tag file (csv format) generated by tofu into its")
+    print("own video clip.")
+    print("")
+    print("Parameters:")
+    print("  -h, --help      Display this message and exit")
+    print("")
+    print("  VIDEO           The labelled video.")
+    print("  CSV             The marks of the video. Marks without end are skipped.")
+    print("  OUTPUT_DIR      Directory of the clips, and of the %s manifest listing" % MANIFEST)
+    print("                  them. Clips already there are not exported again.")
+    print("  -j, --jobs N    Number of worker processes (default: number of cores).")
+    print("  -c, --cache-dir DIR")
+    print("                  Keep the frame index of the video in DIR. The index tells")
+    print("                  which clips begin on a keyframe, and are stream copied")
+    print("                  instead of re-encoded.")
+
+
+def print_progress(done, total):
+    print("\r%d/%d clips" % (done, total), end='', flush=True)
+
+
+def main(argv):
+    if len(argv) == 1 and argv[0] in ["-h", "--help"]:
+        usage()
+        return 0
+
+    positional = []
+    jobs = None
+    cacheDir = None
+    args = iter(argv)
+    try:
+        for arg in args:
+            if arg in ["-j", "--jobs"]:
+                jobs = int(next(args))
+            elif arg in ["-c", "--cache-dir"]:
+                cacheDir = next(args)
+            else:
+                positional.append(arg)
+    except (StopIteration, ValueError):
+        positional = []
+    if len(positional) != 3:
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+    videoPath, csvPath, outputDir = positional
+
+    start = time.perf_counter()
+    try:
+        frameIndex = index_video(videoPath, cacheDir)
+    except INDEX_ERRORS as e:
+        print("Warning: could not index frames, every clip is re-encoded:", e)
+        frameIndex = None
+    with open(csvPath, mode='r') as csv_file:
+        marks = [row for row in csv.reader(csv_file, delimiter=',',
+                                           quotechar='"',
+                                           quoting=csv.QUOTE_MINIMAL)
+                 if len(row) >= 3]
+    failed = export_clips(videoPath, marks, outputDir, frameIndex, jobs,
+                          print_progress)
+    print()
+    for path, error in failed:
+        print("Error:", path, ":", error)
+    print("%d failed in %.2f s" % (len(failed), time.perf_counter() - start))
+    return 0 if not failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
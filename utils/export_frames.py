@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import os
+import csv
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+from frame_export import export_frames, INDEX_FILE, LABELS_FILE, SHARD_FILE
+
+
+def usage():
+    print("export_frames.py -o OUTPUT_DIR [OPTIONS] VIDEO...|-h|--help")
+    print("A tool to decode the marked slices of videos labelled with tofu to frames,")
+    print("stored in .npy files for training.")
+    print("")
+    print("Parameters:")
+    print("  -h, --help      Display this message and exit")
+    print("")
+    print("  VIDEO           A labelled video. Its marks are read from the csv file")
+    print("                  next to it, with the same name. Marks without end are")
+    print("                  skipped.")
+    print("  -o, --output-dir DIR")
+    print("                  Directory of the frames: %s shards of" % SHARD_FILE)
+    print("                  uint8 (frames, height, width, 3) arrays, %s" % INDEX_FILE)
+    print("                  with one (shard, offset, label, time) record per frame, and")
+    print("                  %s with the label of each label id, one per line." % LABELS_FILE)
+    print("  -r, --fps FPS   Frames per second decoded (default: 5).")
+    print("  -s, --size WxH  Size of the frames, padded to keep the aspect ratio")
+    print("                  (default: 224x224).")
+    print("  -n, --shard-frames N")
+    print("                  Frames per shard (default: 4096).")
+    print("  -j, --jobs N    Number of worker processes (default: number of cores).")
+
+
+def read_marks(videoPath):
+    csvPath = os.path.splitext(videoPath)[0] + '.csv'
+    with open(csvPath, mode='r') as csv_file:
+        return [row for row in csv.reader(csv_file, delimiter=',',
+                                          quotechar='"',
+                                          quoting=csv.QUOTE_MINIMAL)
+                if len(row) >= 3]
+
+
+def print_progress(done, total):
+    print("\r%d/%d slices" % (done, total), end='', flush=True)
+
+
+def main(argv):
+    if len(argv) == 1 and argv[0] in ["-h", "--help"]:
+        usage()
+        return 0
+
+    videoPaths = []
+    outputDir = None
+    options = {}
+    args = iter(argv)
+    try:
+        for arg in args:
+            if arg in ["-o", "--output-dir"]:
+                outputDir = next(args)
+            elif arg in ["-r", "--fps"]:
+                options['fps'] = float(next(args))
+            elif arg in ["-s", "--size"]:
+                width, height = next(args).lower().split('x')
+                options['width'] = int(width)
+                options['height'] = int(height)
+            elif arg in ["-n", "--shard-frames"]:
+                options['shardFrames'] = int(next(args))
+            elif arg in ["-j", "--jobs"]:
+                options['jobs'] = int(next(args))
+            else:
+                videoPaths.append(arg)
+    except (StopIteration, ValueError):
+        videoPaths = []
+    if not videoPaths or outputDir is None:
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+
+    start = time.perf_counter()
+    videos = []
+    for videoPath in videoPaths:
+        try:
+            videos.append((videoPath, read_marks(videoPath)))
+        except OSError as e:
+            print("Error:", e)
+            return 1
+    index, failed = export_frames(videos, outputDir, progress=print_progress,
+                                  **options)
+    print()
+    for videoPath, begin, error in failed:
+        print("Error:", videoPath, "at", begin, "ms:", error)
+    print("%d frames exported, %d slices failed in %.2f s"
+          % (len(index), len(failed), time.perf_counter() - start))
+    return 0 if not failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
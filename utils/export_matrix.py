@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import os
+import csv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+from timecodec import str_to_ms, marks_from_rows
+from label_matrix import export_matrix, frame_times
+
+
+def usage():
+    print("export_matrix.py [OPTIONS] INPUT OUTPUT|-h|--help")
+    print("A tool to convert tag files (csv format) generated by tofu to frame level")
+    print("targets: a frames x labels matrix, in a .npz file.")
+    print("")
+    print("Parameters:")
+    print("  -h, --help      Display this message and exit")
+    print("")
+    print("  INPUT           A csv file generated by tofu.")
+    print("  OUTPUT          The .npz file, holding the frame times, the label of each")
+    print("                  column, and the matrix of 0/1.")
+    print("  -r, --fps FPS   Frames per second (default: 25).")
+    print("  -d, --duration HH:MM:SS,mmm")
+    print("                  Duration of the video (default: end of the last mark).")
+    print("  -l, --labels LABELS")
+    print("                  A label file exported by tofu. The labels of each group")
+    print("                  exclude each other, and give a single class column.")
+    print("  --runs          Store (column, first frame, last frame + 1) runs instead")
+    print("                  of dense columns, for long videos.")
+
+
+def read_rows(path):
+    with open(path, mode='r') as csv_file:
+        return list(csv.reader(csv_file, delimiter=',', quotechar='"',
+                               quoting=csv.QUOTE_MINIMAL))
+
+
+def main(argv):
+    if len(argv) == 1 and argv[0] in ["-h", "--help"]:
+        usage()
+        return 0
+
+    positional = []
+    fps = 25
+    duration = None
+    labelsFile = None
+    encoding = 'dense'
+    args = iter(argv)
+    try:
+        for arg in args:
+            if arg in ["-r", "--fps"]:
+                fps = float(next(args))
+            elif arg in ["-d", "--duration"]:
+                duration = str_to_ms(next(args))
+                if duration < 0:
+                    raise ValueError()
+            elif arg in ["-l", "--labels"]:
+                labelsFile = next(args)
+            elif arg == "--runs":
+                encoding = 'runs'
+            else:
+                positional.append(arg)
+    except (StopIteration, ValueError):
+        positional = []
+    if len(positional) != 2:
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+
+    try:
+        labels, begins, ends = marks_from_rows(read_rows(positional[0]))
+        groups = {}
+        if labelsFile is not None:
+            # id, label, shortcut, group, pred incompatibilities
+            groups = {row[1]: row[3] for row in read_rows(labelsFile)
+                      if len(row) == 5}
+    except OSError as e:
+        print("Error:", e)
+        return 1
+    if duration is None:
+        duration = int(max(ends.max(initial=0), begins.max(initial=0))) + 1
+    result = export_matrix(positional[1], labels, begins, ends,
+                           frame_times(duration, fps), groups, encoding)
+    print("%d frames, %d labels, %d groups" % (len(result['times']),
+                                               len(result['labels']),
+                                               len(result['groups'])))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -2,106 +2,178 @@
 # coding: utf-8
 
 import sys
+import os
 import csv
+import glob
+import io
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+from timecodec import format_time, parse_times
+
+# rows parsed at once when reading a csv file
+CHUNK_SIZE = 65536
+
+
+def join_tags(tags):
+    # same result as appending the tags one by one with a space in between,
+    # starting from an empty text
+    k = 0
+    while k < len(tags) and tags[k] == "":
+        k += 1
+    return " ".join(tags[k:])
 
-def timestampToInt(timestamp):
-    ts1 = timestamp.split(",")
-    ms = int(ts1[1])
-    ts2 = ts1[0].split(":")
-    h = int(ts2[0])
-    m = int(ts2[1])
-    s = int(ts2[2])
-    return ms + 1000 * (s + 60 * (m + 60 * h))
-
-
-class Subtitle:
-    def __init__(self, text, timestamp):
-        self.text = text
-        self.timestamp = timestamp
-        self.intTS = timestampToInt(timestamp)
-        
-        
-    def __repr__(self):
-        return "%s: %s" % (self.timestamp, self.text)
-        
-    def add_tag(self, tag):
-        if self.text == "":
-            self.text = tag
-        else:
-            self.text += " " + tag
-        
 
 class Subtitles:
-    
-    def __init__(self):
-        self.messages = []
+    # Tags are stored as columns, and the subtitles are produced by a sweep
+    # over the sorted begin/end timestamps: each segment between two
+    # consecutive timestamps shows the tags covering it, in the order of the
+    # input rows. A tag of null duration gets its own (null) segment, unless
+    # its timestamp was already used by a previous row.
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.begins = array('q')
+        self.ends = array('q')
+        self.tagIds = array('l')
+        self.tags = []
+        self.tagIdx = {}
+        # timestamps written differently than format_time would do,
+        # indexed by (row, column)
+        self.texts = {}
+        self.seen = 0
 
     def __str__(self):
-        result = ""
-        i = 1
-        for m1, m2 in zip(self.messages, self.messages[1:]):
-            if m1.text != "":
-                result += str(i) + "\r\n"
-                result += m1.timestamp + " --> " + m2.timestamp + "\r\n"
-                result += m1.text + "\r\n\r\n"
-                i += 1
-        return result
-    
+        result = io.StringIO()
+        self.write(result)
+        return result.getvalue()
+
+    def __len__(self):
+        return len(self.begins)
+
     def add_row(self, row):
+        self.add_rows([row])
+
+    def add_rows(self, rows):
         threshold_warning_sec = 5
-        if row[2] == "...":
-            row[2] = "06:00:00,000"
-        if len(self.messages) == 0:
-            self.messages.append(Subtitle(row[0], row[1]))
-            self.messages.append(Subtitle("", row[2]))
-        else:
-            begin = timestampToInt(row[1])
-            end = timestampToInt(row[2])
-            if end - begin > 1000 * threshold_warning_sec:
-                print("Duration >", threshold_warning_sec, "seconds:", row)
-            
-            firstInside = next((i for i, m in enumerate(self.messages) if m.intTS >= begin), -1)
-            firstOutside = next((i for i, m in enumerate(self.messages) if m.intTS >= end), -1)
-            
-            # the new interval is before any timestamp
-            if firstInside == -1:
-                self.messages.append(Subtitle(row[0], row[1]))
-                self.messages.append(Subtitle("", row[2]))
+        for row in rows:
+            if row[2] == "...":
+                row[2] = "06:00:00,000"
+        begins, beginsCanonical = parse_times([row[1] for row in rows], True)
+        ends, endsCanonical = parse_times([row[2] for row in rows], True)
+        valid = (begins >= 0) & (ends >= begins)
+
+        if self.verbose:
+            tooLong = ends - begins > 1000 * threshold_warning_sec
+            if self.seen == 0:
+                tooLong[:1] = False
+            for k in np.flatnonzero(tooLong | ~valid):
+                if tooLong[k]:
+                    print("Duration >", threshold_warning_sec, "seconds:",
+                          rows[k])
+                if not valid[k]:
+                    print("Invalid or ends before it begins, ignored:",
+                          rows[k])
+        self.seen += len(rows)
+
+        # timestamps that can not be written back from their value
+        rowids = len(self.begins) - 1 + np.cumsum(valid)
+        for column, canonical in [(1, beginsCanonical), (2, endsCanonical)]:
+            for k in np.flatnonzero(valid & ~canonical):
+                self.texts[(int(rowids[k]), column)] = rows[k][column]
+
+        tagIdx = self.tagIdx
+        for k in np.flatnonzero(valid):
+            tag = rows[k][0]
+            tagId = tagIdx.get(tag)
+            if tagId is None:
+                tagId = tagIdx[tag] = len(self.tags)
+                self.tags.append(tag)
+            self.tagIds.append(tagId)
+        self.begins.frombytes(begins[valid].tobytes())
+        self.ends.frombytes(ends[valid].tobytes())
+
+    def timestamp(self, rowid, column):
+        if self.texts and (rowid, column) in self.texts:
+            return self.texts[(rowid, column)]
+        return format_time(self.begins[rowid] if column == 1
+                           else self.ends[rowid])
+
+    def text(self, rowids):
+        tags, tagIds = self.tags, self.tagIds
+        if len(rowids) == 1:
+            for r in rowids:
+                return tags[tagIds[r]]
+        return join_tags([tags[tagIds[r]] for r in sorted(rowids)])
+
+    def segments(self):
+        # yields (begin, end, text) for every segment with a text
+        begins, ends, n = self.begins, self.ends, len(self.begins)
+        byBegin = sorted(range(n), key=begins.__getitem__)
+        byEnd = sorted(range(n), key=ends.__getitem__)
+        # sorted timestamps, with a sentinel at the end
+        beginKeys = [begins[r] for r in byBegin]
+        endKeys = [ends[r] for r in byEnd]
+        beginKeys.append(float('inf'))
+        endKeys.append(float('inf'))
+        timestamp = self.timestamp
+
+        active = set()
+        # the current segment: its text and its begin
+        text = ""
+        textBegin = None
+        i = j = 0
+        while i < n or j < n:
+            ts = min(beginKeys[i], endKeys[j])
+            i0, j0 = i, j
+            while beginKeys[i] == ts:
+                i += 1
+            while endKeys[j] == ts:
+                j += 1
+
+            # the first row using a timestamp gives its text
+            firstStarting = byBegin[i0] if i0 < i else n
+            firstEnding = byEnd[j0] if j0 < j else n
+            if firstEnding <= firstStarting:
+                tsText = timestamp(firstEnding, 2)
             else:
-                if firstInside == 0:
-                    lastText = ""
-                else:
-                    lastText = self.messages[firstInside - 1].text
-                
-                untilTheEnd = firstOutside == -1
-                
-                # add a supplementary subtitle at the begining if required
-                if self.messages[firstInside].intTS > begin:
-                    sub = Subtitle(lastText, row[1])
-                    sub.add_tag(row[0])
-                    self.messages.insert(firstInside, sub)
-                    firstOutside += 1
-                elif self.messages[firstInside].intTS == begin:
-                    # the current is also the first inside
-                    firstInside -= 1
-                
-                
-                # update exiting messages
-                for i in range(firstInside + 1, len(self.messages) if untilTheEnd else firstOutside):
-                    lastText = self.messages[i].text
-                    self.messages[i].add_tag(row[0])
-
-                if untilTheEnd:
-                    self.messages.append(Subtitle(lastText, row[2]))
-                else:
-                    # add a supplementary subtitle at the end if required
-                    if self.messages[firstOutside].intTS > end:
-                        sub = Subtitle(lastText, row[2])
-                        self.messages.insert(firstOutside, sub)
+                tsText = timestamp(firstStarting, 1)
+            point = firstStarting == firstEnding
+            if text != "":
+                yield (textBegin, timestamp(firstStarting, 1) if point
+                       else tsText, text)
+
+            if j0 < j:
+                active.difference_update(byEnd[j0:j])
+            for r in byBegin[i0:i]:
+                if ends[r] > ts:
+                    active.add(r)
+            if point:
+                pointText = self.text(active | {firstStarting})
+                if pointText != "":
+                    yield timestamp(firstStarting, 1), tsText, pointText
+            text = self.text(active) if active else ""
+            textBegin = tsText
+
+    def write(self, out):
+        # segments are written by blocks to keep the memory bounded
+        block = []
+        for i, (begin, end, text) in enumerate(self.segments(), 1):
+            block.append("%d\r\n%s --> %s\r\n%s\r\n\r\n" %
+                         (i, begin, end, text))
+            if len(block) == 4096:
+                out.write("".join(block))
+                block = []
+        out.write("".join(block))
 
 
 def usage():
-    print("tags2srt.py [INPUT [OUTPUT]|-h|--help]")
+    print("tags2srt.py [INPUT [OUTPUT]|-b|--batch [OPTIONS] PATH...|-h|--help]")
     print("A tool to convert tag files (csv format) generated by tofu to subtitles (srt).")
     print("")
     print("Parameters:")
@@ -112,9 +184,18 @@ def usage():
     print("  OUTPUT          A srt file to be loaded as a subtitle for the initial video.")
     print("                  If no output is defined, result is printed in the standard")
     print("                  output.")
+    print("")
+    print("Batch mode:")
+    print("  -b, --batch     Convert every csv file found in the given PATHs, which are")
+    print("                  files, directories (searched recursively) or glob patterns.")
+    print("                  Each srt file is written next to its csv file, and is only")
+    print("                  regenerated if it is older than the csv file.")
+    print("  -o, --output-dir DIR")
+    print("                  Write the srt files in DIR instead.")
+    print("  -j, --jobs N    Number of worker processes (default: number of cores).")
 
 
-def build_subtitles(inputFile):
+def build_subtitles(inputFile, verbose=True):
     
     try:
         csv_file = open(inputFile, mode='r')
@@ -122,38 +203,147 @@ def build_subtitles(inputFile):
         print("Could not open/read file:", inputFile)
         return None
 
-    subtitles = Subtitles()
+    subtitles = Subtitles(verbose)
     with csv_file:
         tags = csv.reader(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
         
+        chunk = []
         for row in tags:
             if len(row) == 3:
-                subtitles.add_row(row)
+                chunk.append(row)
+                if len(chunk) == CHUNK_SIZE:
+                    subtitles.add_rows(chunk)
+                    chunk = []
+        subtitles.add_rows(chunk)
     
     return subtitles
-        
 
-if not len(sys.argv) in [2, 3]:
-    print("Error: wrong number of parameters")
-    print("")
-    usage()
-    exit(1)
 
-if len(sys.argv) == 2 and sys.argv[1] in ["-h", "--help"]:
-    usage()
-    exit(0)
-    
-    
-    
+def convert(inputFile, outputFile, verbose=True):
+    # returns the number of tags converted, or None on error
+    subtitles = build_subtitles(inputFile, verbose)
+    if subtitles is None:
+        return None
+    try:
+        with open(outputFile, mode='w') as srtFile:
+            subtitles.write(srtFile)
+    except OSError:
+        print("Could not write file:", outputFile)
+        return None
+    return len(subtitles)
+
+
+def convert_quietly(files):
+    return convert(files[0], files[1], False)
+
+
+def find_inputs(paths):
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                inputs += [os.path.join(root, f) for f in sorted(files)
+                           if f.lower().endswith(".csv")]
+        elif glob.has_magic(path):
+            inputs += sorted(glob.glob(path, recursive=True))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def output_path(inputFile, outputDir):
+    outputFile = os.path.splitext(inputFile)[0] + ".srt"
+    if outputDir is not None:
+        outputFile = os.path.join(outputDir, os.path.basename(outputFile))
+    return outputFile
+
+
+def is_up_to_date(inputFile, outputFile):
+    try:
+        return os.path.getmtime(outputFile) >= os.path.getmtime(inputFile)
+    except OSError:
+        return False
+
+
+def batch(paths, outputDir=None, jobs=None):
+    start = time.perf_counter()
+    if outputDir is not None:
+        os.makedirs(outputDir, exist_ok=True)
+
+    todo = []
+    skipped = 0
+    for inputFile in find_inputs(paths):
+        outputFile = output_path(inputFile, outputDir)
+        if is_up_to_date(inputFile, outputFile):
+            skipped += 1
+        else:
+            todo.append((inputFile, outputFile))
+
+    converted = failed = rows = 0
+    if todo:
+        jobs = jobs or os.cpu_count() or 1
+        # several files per task, so that small files do not cost one
+        # round trip to a worker each
+        chunksize = max(1, len(todo) // (4 * jobs))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for result in pool.map(convert_quietly, todo, chunksize=chunksize):
+                if result is None:
+                    failed += 1
+                else:
+                    converted += 1
+                    rows += result
+
+    elapsed = time.perf_counter() - start
+    print("%d converted, %d up to date, %d failed in %.2f s"
+          % (converted, skipped, failed, elapsed))
+    if elapsed > 0:
+        print("%.1f files/s, %.0f tags/s" % (converted / elapsed, rows / elapsed))
+    return failed == 0
+
+
+def main(argv):
+    if len(argv) > 0 and argv[0] in ["-b", "--batch"]:
+        paths = []
+        outputDir = None
+        jobs = None
+        args = iter(argv[1:])
+        try:
+            for arg in args:
+                if arg in ["-o", "--output-dir"]:
+                    outputDir = next(args)
+                elif arg in ["-j", "--jobs"]:
+                    jobs = int(next(args))
+                else:
+                    paths.append(arg)
+        except (StopIteration, ValueError):
+            paths = []
+        if not paths:
+            print("Error: wrong parameters")
+            print("")
+            usage()
+            return 1
+        return 0 if batch(paths, outputDir, jobs) else 1
+
+    if not len(argv) in [1, 2]:
+        print("Error: wrong number of parameters")
+        print("")
+        usage()
+        return 1
+
+    if len(argv) == 1 and argv[0] in ["-h", "--help"]:
+        usage()
+        return 0
 
-subtitles = build_subtitles(sys.argv[1])
+    if len(argv) == 1:
+        subtitles = build_subtitles(argv[0])
+        if subtitles is None:
+            return 1
+        subtitles.write(sys.stdout)
+        print()
+    elif convert(argv[0], argv[1]) is None:
+        return 1
+    return 0
 
-if subtitles == None:
-    exit(1)
 
-if len(sys.argv) == 2:
-    print(subtitles)
-else:
-     with open(sys.argv[2], mode='w') as srtFile:
-            srtFile.write(str(subtitles))
-                
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import os
+import csv
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+from timecodec import format_time, str_to_ms, marks_from_rows
+from store import AnnotationStore
+from tags2srt import find_inputs
+
+# csv files ingested per transaction
+BATCH_SIZE = 200
+
+
+def usage():
+    print("tofu_store.py DATABASE ingest [-n N] PATH...|DATABASE query [OPTIONS]|-h|--help")
+    print("A tool to gather the marks of many videos in a SQLite database, and query them.")
+    print("")
+    print("Parameters:")
+    print("  -h, --help      Display this message and exit")
+    print("")
+    print("  DATABASE        The SQLite file, created if needed. The application uses it")
+    print("                  too when the TOFU_STORE environment variable names it.")
+    print("")
+    print("Ingest:")
+    print("  PATH            csv files generated by tofu, directories (searched")
+    print("                  recursively) or glob patterns. The marks of a video are")
+    print("                  replaced by the ones of its csv file.")
+    print("  -n N            Number of files per transaction (default: %d)." % BATCH_SIZE)
+    print("")
+    print("Query, marks printed as csv (video, label, begin, end):")
+    print("  -l, --label PATTERN")
+    print("                  Only the labels matching the glob PATTERN, e.g. 'Bras*'.")
+    print("  -m, --min-duration SECONDS")
+    print("                  Only the marks lasting at least SECONDS.")
+    print("  -f, --from TIME, -t, --to TIME")
+    print("                  Only the marks intersecting [from, to], as HH:MM:SS,mmm.")
+
+
+def read_marks(csvPath):
+    with open(csvPath, mode='r') as csv_file:
+        rows = csv.reader(csv_file, delimiter=',', quotechar='"',
+                          quoting=csv.QUOTE_MINIMAL)
+        return marks_from_rows(rows)
+
+
+def ingest(store, paths, batchSize=BATCH_SIZE):
+    start = time.perf_counter()
+    files = failed = rows = 0
+    for csvPath in find_inputs(paths):
+        try:
+            labels, begins, ends = read_marks(csvPath)
+        except (OSError, ValueError, csv.Error) as e:
+            print("Error:", csvPath, ":", e)
+            failed += 1
+            continue
+        store.putMarks(csvPath, labels, begins, ends)
+        files += 1
+        rows += len(labels)
+        if files % batchSize == 0:
+            store.commit()
+    store.commit()
+
+    elapsed = time.perf_counter() - start
+    print("%d files, %d marks ingested, %d failed in %.2f s"
+          % (files, rows, failed, elapsed))
+    return failed == 0
+
+
+def query(store, label=None, minDuration=None, begin=None, end=None):
+    writer = csv.writer(sys.stdout, delimiter=',', quotechar='"',
+                        quoting=csv.QUOTE_MINIMAL)
+    for video, name, b, e in store.query(label, minDuration, begin, end):
+        writer.writerow([video, name, format_time(b),
+                         '...' if e < 0 else format_time(e)])
+    return True
+
+
+def parse_time(text):
+    ms = str_to_ms(text)
+    if ms < 0:
+        raise ValueError(text)
+    return ms
+
+
+def main(argv):
+    if len(argv) == 1 and argv[0] in ["-h", "--help"]:
+        usage()
+        return 0
+    if len(argv) < 2 or argv[1] not in ["ingest", "query"]:
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+
+    database, command = argv[0], argv[1]
+    options = {}
+    paths = []
+    args = iter(argv[2:])
+    try:
+        for arg in args:
+            if command == "ingest" and arg == "-n":
+                options['batchSize'] = int(next(args))
+            elif command == "query" and arg in ["-l", "--label"]:
+                options['label'] = next(args)
+            elif command == "query" and arg in ["-m", "--min-duration"]:
+                options['minDuration'] = int(float(next(args)) * 1000)
+            elif command == "query" and arg in ["-f", "--from"]:
+                options['begin'] = parse_time(next(args))
+            elif command == "query" and arg in ["-t", "--to"]:
+                options['end'] = parse_time(next(args))
+            elif command == "ingest":
+                paths.append(arg)
+            else:
+                raise ValueError(arg)
+    except (StopIteration, ValueError):
+        print("Error: wrong parameters")
+        print("")
+        usage()
+        return 1
+    if command == "ingest" and not paths:
+        print("Error: no csv file to ingest")
+        return 1
+
+    store = AnnotationStore(database)
+    try:
+        if command == "ingest":
+            ok = ingest(store, paths, **options)
+        else:
+            ok = query(store, **options)
+    finally:
+        store.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))